@@ -0,0 +1,56 @@
+import argparse
+import json
+import sys
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """Per-stage median ratios current / baseline; stages slower by more than `threshold` are regressions."""
+    rows = []
+    for stage, result in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {}).get("seconds")
+        after = result.get("seconds")
+        ratio = after / before if before and after is not None else None
+        rows.append({"stage": stage, "baseline": before, "current": after, "ratio": ratio,
+                     "regression": ratio is not None and ratio > 1 + threshold,
+                     "improvement": ratio is not None and ratio < 1 - threshold})
+
+    if baseline.get("corpus") != current.get("corpus"):
+        warning = "corpus options differ, timings are not directly comparable"
+    else:
+        warning = None
+    return {"rows": rows, "regressions": [row["stage"] for row in rows if row["regression"]],
+            "threshold": threshold, "warning": warning,
+            "baseline_commit": baseline.get("git_commit"), "current_commit": current.get("git_commit")}
+
+
+def print_comparison(comparison):
+    def seconds(value):
+        return f"{value:.3f}s" if value is not None else "-"
+
+    print(f"Baseline {comparison['baseline_commit']} -> current {comparison['current_commit']}"
+          f" (threshold {comparison['threshold']:.0%})")
+    if comparison["warning"]:
+        print(f"⚠️ {comparison['warning']}")
+    print(f"{'stage':<20}{'baseline':>12}{'current':>12}{'ratio':>10}")
+    for row in comparison["rows"]:
+        mark = " ❌ slower" if row["regression"] else " ✅ faster" if row["improvement"] else ""
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+        print(f"{row['stage']:<20}{seconds(row['baseline']):>12}{seconds(row['current']):>12}{ratio:>10}{mark}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Baseline results JSON")
+    parser.add_argument("current", help="Current results JSON")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    comparison = compare_results(baseline, current, args.threshold)
+    print_comparison(comparison)
+    sys.exit(1 if comparison["regressions"] else 0)
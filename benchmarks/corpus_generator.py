@@ -0,0 +1,154 @@
+import argparse
+import bisect
+import csv
+import logging
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+from src.common_logging import setup_logging
+from src.corpus_manifest import write_transcript_file
+from src.transcript_segments import encode_segments, segments_from_fetch
+from src.transcript_store import TranscriptStore
+
+SIZE_DISTRIBUTIONS = ("lognormal", "uniform", "fixed")
+
+_ONSETS = ["", "b", "d", "g", "k", "m", "n", "p", "r", "s", "t", "w", "z", "ch", "cz", "sz", "pr", "st", "tr", "kr"]
+_VOWELS = ["a", "e", "i", "o", "u", "y", "ą", "ę", "ó"]
+_CODAS = ["", "", "", "n", "k", "s", "r", "ł", "m", "ć", "ż"]
+_ENDINGS = ["", "a", "y", "u", "e", "ie", "om", "ami", "ach", "ów", "owi", "ego", "emu"]
+
+
+def make_vocabulary(rng, size):
+    # pseudo-Polish stems, each used with several inflected endings
+    stems = set()
+    while len(stems) < size:
+        syllables = rng.randint(1, 3)
+        stems.add("".join(rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS) for _ in range(syllables)))
+    return sorted(stems)
+
+
+class ZipfSampler:
+    """Draws vocabulary ranks with p(rank) ~ 1 / rank ** exponent, like word frequencies in speech."""
+
+    def __init__(self, rng, size, exponent=1.1):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, size + 1):
+            total += 1 / rank ** exponent
+            self.cumulative.append(total)
+
+    def sample(self):
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def transcript_size(rng, distribution, median_chars, sigma):
+    if distribution == "fixed":
+        return median_chars
+    if distribution == "uniform":
+        return rng.randint(max(1, int(median_chars * (1 - sigma))), int(median_chars * (1 + sigma)))
+    return max(200, int(median_chars * math.exp(rng.gauss(0, sigma))))
+
+
+def make_transcript(rng, words, sampler, target_chars):
+    # youtube_transcript_api-like entries of 6-14 words, ~0.4s per word
+    entries = []
+    start = 0.0
+    length = 0
+    while length < target_chars:
+        n_words = rng.randint(6, 14)
+        text = " ".join(words[sampler.sample()] + rng.choice(_ENDINGS) for _ in range(n_words))
+        duration = round(n_words * 0.4, 2)
+        entries.append({"text": text, "start": round(start, 2), "duration": duration})
+        start += duration
+        length += len(text) + 1
+    return entries
+
+
+def generate_corpus(output_dir, channels=5, videos_per_channel=100, size_distribution="lognormal",
+                    median_chars=20000, sigma=0.8, vocabulary_size=20000, days=365,
+                    start_date="2024-01-01", packed=False, seed=0):
+    """Writes `<output_dir>/transcripts/<channel>/<video_id>.seg` (or a packed corpus) and `analyze_list.csv`.
+
+    The same arguments always produce byte-identical output. Returns (analyze_list_csv, transcripts_dir,
+    corpus_dir or None, number of videos, total transcript characters).
+    """
+    if size_distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown size distribution '{size_distribution}', expected one of {SIZE_DISTRIBUTIONS}")
+
+    rng = random.Random(seed)
+    words = make_vocabulary(rng, vocabulary_size)
+    sampler = ZipfSampler(rng, len(words))
+    first_day = datetime.strptime(start_date, "%Y-%m-%d")
+
+    transcripts_dir = os.path.join(output_dir, "transcripts")
+    corpus_dir = os.path.join(output_dir, "corpus") if packed else None
+    analyze_list_csv = os.path.join(output_dir, "analyze_list.csv")
+    os.makedirs(transcripts_dir, exist_ok=True)
+    store = TranscriptStore(corpus_dir) if packed else None
+
+    total_chars = 0
+    with open(analyze_list_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["video_id", "title", "description", "published_at", "channel_id", "channel_name"])
+        for channel_no in range(channels):
+            channel_id = f"UCbench{channel_no:04d}"
+            channel_dir = os.path.join(transcripts_dir, channel_id)
+            os.makedirs(channel_dir, exist_ok=True)
+
+            for video_no in range(videos_per_channel):
+                video_id = f"v{channel_no:03d}{video_no:07d}"
+                published_at = first_day + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+                entries = make_transcript(rng, words, sampler,
+                                          transcript_size(rng, size_distribution, median_chars, sigma))
+                record = encode_segments(segments_from_fetch(entries))
+                total_chars += sum(len(entry["text"]) + 1 for entry in entries)
+
+                if store is not None:
+                    store.append(video_id, channel_id, record)
+                else:
+                    write_transcript_file(os.path.join(channel_dir, f"{video_id}.seg"), record)
+
+                title = " ".join(words[sampler.sample()] for _ in range(6))
+                writer.writerow([video_id, title, entries[0]["text"], published_at.strftime("%Y-%m-%d %H:%M:%S"),
+                                 channel_id, f"Bench channel {channel_no}"])
+
+    if store is not None:
+        store.close()
+    n_videos = channels * videos_per_channel
+    logging.info(f"✅ Generated {n_videos} transcripts ({total_chars / 1e6:.1f}M characters) in {output_dir}")
+    return analyze_list_csv, transcripts_dir, corpus_dir, n_videos, total_chars
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--channels", type=int, default=5, help="Number of channels (default: 5)")
+    parser.add_argument("--videos-per-channel", type=int, default=100, help="Videos per channel (default: 100)")
+    parser.add_argument("--size-distribution", choices=SIZE_DISTRIBUTIONS, default="lognormal",
+                        help="Transcript size distribution (default: lognormal)")
+    parser.add_argument("--median-chars", type=int, default=20000,
+                        help="Median transcript size in characters (default: 20000, ~25 min of speech)")
+    parser.add_argument("--sigma", type=float, default=0.8,
+                        help="Spread: lognormal sigma, or +/- fraction for uniform (default: 0.8)")
+    parser.add_argument("--vocabulary-size", type=int, default=20000, help="Distinct stems (default: 20000)")
+    parser.add_argument("--days", type=int, default=365, help="Publication dates spread over N days (default: 365)")
+    parser.add_argument("--packed", action="store_true", help="Write a packed corpus instead of .seg files")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+
+def corpus_options(args):
+    return {"channels": args.channels, "videos_per_channel": args.videos_per_channel,
+            "size_distribution": args.size_distribution, "median_chars": args.median_chars, "sigma": args.sigma,
+            "vocabulary_size": args.vocabulary_size, "days": args.days, "packed": args.packed, "seed": args.seed}
+
+
+if __name__ == "__main__":
+    setup_logging(script_name="corpus_generator")
+
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic transcript corpus")
+    parser.add_argument("--output", required=True, help="Output directory")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    generate_corpus(args.output, **corpus_options(args))
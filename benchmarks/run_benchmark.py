@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from benchmarks.compare import compare_results, print_comparison
+from benchmarks.corpus_generator import generate_corpus, add_corpus_arguments, corpus_options
+from src.common_logging import setup_logging
+from src.metrics import metrics
+
+STAGES = ("load_transcripts", "nlp", "trend_aggregation", "rollups", "matrix_export", "plotting")
+# parts of the stages above, read from the analyzer's own metrics stages; reported, not added to the total
+SUBSTAGES = {"counting": "count"}
+
+
+@contextmanager
+def benchmark_stage(name, errors):
+    # timed as the metrics stage `benchmark_<name>`, a broken stage is reported and the following ones still run
+    try:
+        with metrics.stage(f"benchmark_{name}"):
+            yield
+    except Exception as e:
+        errors[name] = f"{type(e).__name__}: {e}"
+
+
+def stage_timings():
+    # seconds of the benchmark stages and substages in the current `metrics` run
+    recorded = {name: stage["seconds"] for name, stage in metrics.snapshot()["stages"].items()}
+    timings = {stage: recorded.get(f"benchmark_{stage}") for stage in STAGES}
+    timings.update({stage: recorded.get(source) for stage, source in SUBSTAGES.items()})
+    return {stage: seconds for stage, seconds in timings.items() if seconds is not None}
+
+
+def run_pipeline(analyze_list_csv, transcripts_dir, corpus_dir, work_dir, workers):
+    """One pass through the trend pipeline on the stub NLP backend, every stage timed on its own.
+
+    Stages call the analyzer's own steps, so the benchmark times the code `analyze` runs.
+    Timings go to `metrics`, returns {stage: error} of the stages that failed.
+    """
+    from src.analyzers.trend_matrix import SparseTrendMatrix
+    from src.analyzers.word_trend import WordTrendAnalyzer
+
+    analyzer = WordTrendAnalyzer(analyze_list_csv, transcripts_dir, os.path.join(work_dir, "word_trends.csv"),
+                                 output_dir=work_dir, max_workers=workers, backend="stub",
+                                 lemma_cache_path=None, lemma_table_path=None, corpus_dir=corpus_dir)
+    analyzer.output_plots_dir = work_dir
+
+    errors = {}
+    transcripts, lemmas, matrix = [], [], None
+    try:
+        with benchmark_stage("load_transcripts", errors):
+            transcripts = list(analyzer.iter_transcripts(with_channel=True))
+
+        with benchmark_stage("nlp", errors):
+            # corpus-wide scheduler, results come back in completion order
+            done = {idx: video_lemmas for idx, _, video_lemmas, _ in analyzer.scheduler.run(
+                (idx, text) for idx, (_, _, _, text) in enumerate(transcripts))}
+            lemmas = [done[idx] for idx in range(len(transcripts))]
+
+        with benchmark_stage("trend_aggregation", errors):
+            # word counting and the trend store update, as for every lemmatized video in `analyze`
+            for (video_id, channel_id, published_at, text), video_lemmas in zip(transcripts, lemmas):
+                date = published_at[:10]
+                analyzer.apply_lemmas(video_id, analyzer.video_content_key(date, channel_id, text), date,
+                                      video_lemmas, channel_id)
+            analyzer.trend_store.commit()
+
+        with benchmark_stage("rollups", errors):
+            analyzer.update_rollups(changed=True)
+
+        with benchmark_stage("matrix_export", errors):
+            matrix = SparseTrendMatrix.from_counts(analyzer.trend_store.iter_counts())
+            analyzer.export_matrix_to_csv(matrix)
+
+        with benchmark_stage("plotting", errors):
+            analyzer.plot_word_trends(matrix.top_frame(analyzer.top_n))
+            if analyzer.renderer.wait():
+                raise RuntimeError("chart rendering failed, see the log")
+    finally:
+        analyzer.close()
+
+    return errors
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(work_dir, options, repeat=3, workers=4):
+    # the corpus is deterministic, so it is generated once per set of options and reused
+    corpus_key = hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    corpus_root = os.path.join(work_dir, f"corpus-{corpus_key}")
+    corpus_info = os.path.join(corpus_root, "corpus.json")
+    if os.path.exists(corpus_info):
+        with open(corpus_info, "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+    else:
+        shutil.rmtree(corpus_root, ignore_errors=True)
+        analyze_list_csv, transcripts_dir, corpus_dir, n_videos, total_chars = generate_corpus(corpus_root, **options)
+        corpus = {"analyze_list_csv": analyze_list_csv, "transcripts_dir": transcripts_dir, "corpus_dir": corpus_dir,
+                  "n_videos": n_videos, "total_chars": total_chars}
+        with open(corpus_info, "w", encoding="utf-8") as f:
+            json.dump(corpus, f)
+
+    runs = {stage: [] for stage in (*STAGES, *SUBSTAGES)}
+    errors = {}
+    counters = {}
+    for run_no in range(repeat):
+        run_dir = os.path.join(work_dir, f"run-{run_no}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.makedirs(run_dir)
+
+        metrics.reset()
+        level = logging.getLogger().level
+        logging.getLogger().setLevel(logging.WARNING)  # per-file INFO lines would be timed too
+        try:
+            run_errors = run_pipeline(corpus["analyze_list_csv"], corpus["transcripts_dir"], corpus["corpus_dir"],
+                                 run_dir, workers)
+        finally:
+            logging.getLogger().setLevel(level)
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+        timings = stage_timings()
+        for stage in runs:
+            runs[stage].append(timings.get(stage))
+        errors.update(run_errors)
+        counters = metrics.snapshot()["counters"]  # identical in every run, the corpus does not change
+        logging.info(f"⏱️ Run {run_no + 1}/{repeat}: " + ", ".join(
+            f"{stage} {timings[stage]:.3f}s" for stage in runs if stage in timings))
+
+    stages = {}
+    for stage in runs:
+        timings = [timing for timing in runs[stage] if timing is not None]
+        result = {"runs": runs[stage], "error": errors.get(stage)}
+        if timings and stage not in errors:
+            median = statistics.median(timings)
+            result.update({"seconds": median, "min": min(timings),
+                           "chars_per_second": corpus["total_chars"] / median if median else None})
+        else:
+            result["seconds"] = None
+        stages[stage] = result
+
+    return {
+        "benchmark": "trend_pipeline",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "workers": workers,
+        "repeat": repeat,
+        "corpus": {**options, "n_videos": corpus["n_videos"], "total_chars": corpus["total_chars"]},
+        "stages": stages,
+        "counters": counters,
+        "total_seconds": sum(stages[stage]["seconds"] or 0 for stage in STAGES),
+    }
+
+
+if __name__ == "__main__":
+    setup_logging(script_name="benchmark")
+
+    parser = argparse.ArgumentParser(description="Time the transcript pipeline stages on a synthetic corpus")
+    parser.add_argument("--work-dir", default=os.path.join("output", "benchmark"),
+                        help="Corpus and scratch directory (default: output/benchmark/)")
+    parser.add_argument("--output", default=None, help="Results JSON (default: <work-dir>/results-<time>.json)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, the median is reported (default: 3)")
+    parser.add_argument("--workers", type=int, default=4, help="NLP workers (default: 4)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: 0.10)")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.work_dir, corpus_options(args), repeat=args.repeat, workers=args.workers)
+    output = args.output or os.path.join(args.work_dir, f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logging.info(f"✅ Benchmark results saved to {output} (total {results['total_seconds']:.2f}s)")
+    for stage, result in results["stages"].items():
+        if result["error"]:
+            logging.warning(f"⚠️ Stage {stage} failed: {result['error']}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare_results(baseline, results, args.threshold)
+        print_comparison(comparison)
+        sys.exit(1 if comparison["regressions"] else 0)
@@ -2,8 +2,7 @@ import os
 import argparse
 import logging
 from src.common_logging import setup_logging
-from src.analyzers.word_frequency import WordFrequencyAnalyzer
-from src.analyzers.word_trend import WordTrendAnalyzer
+from src.metrics import metrics, add_metrics_arguments, configure_metrics, write_run_report
 
 # Logging
 setup_logging()
@@ -15,17 +14,24 @@ DEFAULT_INPUT_CSV = os.path.join(OUTPUT_DIR, "analyze_list_midel.csv")
 DEFAULT_TRANSCRIPTS_DIR = os.path.join(OUTPUT_DIR, "transcripts")
 DEFAULT_FREQ_CSV = os.path.join(OUTPUT_DIR, "word_frequencies.csv")
 DEFAULT_TREND_CSV = os.path.join(OUTPUT_DIR, "word_trends.csv")
+DEFAULT_SECTION_CSV = os.path.join(OUTPUT_DIR, "sections.csv")
 DEFAULT_MODE = "frequency"
 DEFAULT_TOP = 50
 DEFAULT_MIN_LENGTH = 3
+DEFAULT_WORKERS = 4
+DEFAULT_EXECUTOR = "thread"
+DEFAULT_DOCS_PER_BATCH = 64
+DEFAULT_BACKEND = "stanza"
+DEFAULT_MODEL_DIR = os.getenv("STANZA_RESOURCES_DIR", os.path.join(os.path.expanduser("~"), "stanza_resources"))
 
 def main():
     parser = argparse.ArgumentParser(description="Starting transcripts analysis")
 
     # Base params
-    parser.add_argument("--mode", choices=["frequency", "trend"],
+    parser.add_argument("--mode", choices=["frequency", "trend", "section"],
                         default=DEFAULT_MODE,
-                        help="Mode: 'frequency' (words freq) or 'trend' (words over time)")
+                        help="Mode: 'frequency' (words freq), 'trend' (words over time) "
+                             "or 'section' (transcript sections with keywords)")
 
     parser.add_argument("--input",
                         default=DEFAULT_INPUT_CSV,
@@ -35,9 +41,15 @@ def main():
                         default=DEFAULT_TRANSCRIPTS_DIR,
                         help="Transcripts directory (default: /output/transcripts/)")
 
+    parser.add_argument("--corpus",
+                        help="Packed transcript corpus directory, used instead of --transcripts (see transcript_store.py)")
+
     parser.add_argument("--output", help="Ścieżka do pliku wynikowego CSV")
 
     # Additional params
+    parser.add_argument("--keywords", nargs="+",
+                        help="Section mode: keywords or quoted phrases to look for")
+
     parser.add_argument("--top", type=int,
                         default=DEFAULT_TOP,
                         help=f"Number of most popular words (default: {DEFAULT_TOP})")
@@ -46,11 +58,56 @@ def main():
                         default=DEFAULT_MIN_LENGTH,
                         help=f"Minimal length for analysis (default: {DEFAULT_MIN_LENGTH})")
 
+    parser.add_argument("--matrix-top-k", type=int,
+                        help="Trend mode: keep only the K most frequent words in the word x date matrix")
+
+    parser.add_argument("--matrix-min-total", type=int,
+                        help="Trend mode: skip words with fewer total occurrences in the word x date matrix")
+
+    parser.add_argument("--no-channel-rollups", action="store_true",
+                        help="Trend mode: build the day / week / month rollups without the per-channel split")
+
+    parser.add_argument("--workers", type=int,
+                        default=DEFAULT_WORKERS,
+                        help=f"Number of NLP workers (default: {DEFAULT_WORKERS})")
+
+    parser.add_argument("--executor", choices=["thread", "process"],
+                        default=DEFAULT_EXECUTOR,
+                        help="NLP execution mode: 'thread' (shared pipeline) or 'process' (pipeline per worker process)")
+
+    parser.add_argument("--backend", choices=["stanza", "fast", "stub"],
+                        default=DEFAULT_BACKEND,
+                        help="NLP backend: 'stanza' (full pipeline, also trains the lemma table), "
+                             "'fast' (lemma table lookup, Stanza only for unknown forms) "
+                             "or 'stub' (no models, crude suffix stripping; for benchmarks and smoke tests)")
+
+    parser.add_argument("--model-dir",
+                        default=DEFAULT_MODEL_DIR,
+                        help=f"Stanza models directory (default: {DEFAULT_MODEL_DIR})")
+
+    parser.add_argument("--offline", action="store_true",
+                        help="Use models from --model-dir as they are, never check for downloads")
+
+    parser.add_argument("--cpu", action="store_true",
+                        help="Run Stanza on CPU even if a GPU is available")
+
+    parser.add_argument("--docs-per-batch", type=int,
+                        default=DEFAULT_DOCS_PER_BATCH,
+                        help=f"Transcripts sent to Stanza per bulk call (default: {DEFAULT_DOCS_PER_BATCH})")
+
+    parser.add_argument("--tokenize-batch-size", type=int, help="Stanza tokenizer batch size")
+    parser.add_argument("--pos-batch-size", type=int, help="Stanza POS tagger batch size")
+    parser.add_argument("--lemma-batch-size", type=int, help="Stanza lemmatizer batch size")
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
+    if args.mode == "section" and not args.keywords:
+        parser.error("--mode section requires --keywords")
+    configure_metrics(args)
 
     logging.info(f"🚀 Starting analysis: {args.mode}")
     logging.info(f"📂 Input file: {args.input}")
-    logging.info(f"📂 Transcripts directory: {args.transcripts}")
+    logging.info(f"📂 Transcripts directory: {args.corpus or args.transcripts}")
 
     if args.output:
         output_csv = args.output
@@ -58,19 +115,50 @@ def main():
         output_csv = DEFAULT_FREQ_CSV
     elif args.mode == "trend":
         output_csv = DEFAULT_TREND_CSV
+    elif args.mode == "section":
+        output_csv = DEFAULT_SECTION_CSV
     else:
         raise Exception("args.output problem")
 
     logging.info(f"📂 Output file: {output_csv}")
 
+    batch_sizes = {
+        "tokenize_batch_size": args.tokenize_batch_size,
+        "pos_batch_size": args.pos_batch_size,
+        "lemma_batch_size": args.lemma_batch_size,
+    }
+    batch_sizes = {name: size for name, size in batch_sizes.items() if size}
+    nlp_options = {"model_dir": args.model_dir, "offline": args.offline, "use_gpu": not args.cpu,
+                   "corpus_dir": args.corpus}
+
+    # analyzers (pandas, stopwords, ...) are imported only once the arguments are valid
     if args.mode == "frequency":
-        analyzer = WordFrequencyAnalyzer(args.input, args.transcripts, output_csv, args.top, args.min_length)
+        from src.analyzers.word_frequency import WordFrequencyAnalyzer
+        analyzer = WordFrequencyAnalyzer(args.input, args.transcripts, output_csv, args.top, args.min_length,
+                                         num_threads=args.workers, executor=args.executor,
+                                         batch_sizes=batch_sizes, docs_per_batch=args.docs_per_batch,
+                                         backend=args.backend, **nlp_options)
     elif args.mode == "trend":
-        analyzer = WordTrendAnalyzer(args.input, args.transcripts, output_csv, args.min_length)
+        from src.analyzers.word_trend import WordTrendAnalyzer
+        analyzer = WordTrendAnalyzer(args.input, args.transcripts, output_csv, args.min_length,
+                                     matrix_top_k=args.matrix_top_k, matrix_min_total=args.matrix_min_total,
+                                     rollups_by_channel=not args.no_channel_rollups,
+                                     max_workers=args.workers, executor=args.executor,
+                                     batch_sizes=batch_sizes, docs_per_batch=args.docs_per_batch,
+                                     backend=args.backend, **nlp_options)
+    elif args.mode == "section":
+        from src.analyzers.find_section import FindSectionAnalyzer
+        analyzer = FindSectionAnalyzer(args.input, args.transcripts, args.keywords, output_csv, corpus_dir=args.corpus)
     else:
         raise Exception("args.mode problem")
 
-    analyzer.analyze()
+    try:
+        with metrics.stage(f"analyze_{args.mode}"):
+            analyzer.analyze()
+    finally:
+        analyzer.close()
+        write_run_report(f"analyze_{args.mode}", args.metrics_dir,
+                         mode=args.mode, backend=args.backend, executor=args.executor, workers=args.workers)
     logging.info("✅ Analysis ended!")
 
 
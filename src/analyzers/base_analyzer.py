@@ -1,53 +1,210 @@
 import logging
 import os
+import queue
 import re
+import threading
 import time
 
 import pandas as pd
 
 from src.common_logging import setup_logging
+from src.corpus_manifest import CorpusManifest
+from src.metrics import metrics, BYTES_BUCKETS
+from src.transcript_segments import is_structured, decode_text, decode_segments, segments_from_legacy
+from src.transcript_store import TranscriptStore
 
 setup_logging()
 
+DEFAULT_READ_AHEAD = 64  # transcripts read ahead of the consumer by the I/O thread
+_END_OF_STREAM = object()
+
 
 class BaseAnalyzer:
-    def __init__(self, analyze_list_csv, transcripts_dir):
+    def __init__(self, analyze_list_csv, transcripts_dir, read_ahead=DEFAULT_READ_AHEAD, corpus_dir=None,
+                 use_manifest=True):
         self.analyze_list_csv = analyze_list_csv
         self.transcripts_dir = transcripts_dir
-
-    def load_transcripts(self):
+        self.read_ahead = read_ahead
+        self.total_files = 0
+
+        # packed corpus (see `src/transcript_store.py`) instead of one txt file per video
+        self.store = None
+        if corpus_dir:
+            if not TranscriptStore.exists(corpus_dir):
+                raise FileNotFoundError(f"No packed corpus in {corpus_dir}, run `transcript_store.py migrate` first")
+            self.store = TranscriptStore(corpus_dir)
+
+        # per-video files are looked up in the manifest (see `src/corpus_manifest.py`), not probed with stat/open
+        self.use_manifest = self.store is None and use_manifest and os.path.isdir(transcripts_dir)
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+
+    @property
+    def manifest(self):
+        # ✅ Opened and refreshed on the first transcript lookup, runs that never read the tree skip the scan
+        if self._manifest is None and self.use_manifest:
+            with self._manifest_lock:
+                if self._manifest is None:
+                    manifest = CorpusManifest(self.transcripts_dir)
+                    manifest.refresh()
+                    self._manifest = manifest
+        return self._manifest
+
+    def load_analyze_list(self):
         if not os.path.exists(self.analyze_list_csv):
             logging.error(f"🚨 File {self.analyze_list_csv} does not exist!")
             return []
 
         analyze_list = pd.read_csv(self.analyze_list_csv, dtype=str)
-        transcripts = []
-
-        total_files = len(analyze_list)
-        logging.info(f"📂 Found {total_files} files for analysis.")
-
-        start_time = time.time()
-        for idx, row in analyze_list.iterrows():
-            video_id = row["video_id"]
-            channel_id = row["channel_id"]
-            transcript_path = os.path.join(self.transcripts_dir, channel_id, f"{video_id}.txt")
-
-            if os.path.exists(transcript_path):
-                with open(transcript_path, "r", encoding="utf-8") as f:
-                    text = f.read().lower()
-                    text = re.sub(r"\[\d+:\d+\]", "", text).strip()
-                    transcripts.append((video_id, row.get("published_at"), text))
-            else:
-                logging.warning(f"⚠️ Missing transcript for  {video_id} ({channel_id})")
-
-            if (idx + 1) % 10 == 0 or idx + 1 == total_files:
-                elapsed_time = time.time() - start_time
-                logging.info(f"📊 Processesd {idx + 1}/{total_files} files ({elapsed_time:.2f} s)")
-
-        return transcripts
-
-
-
-
-
+        published = analyze_list["published_at"] if "published_at" in analyze_list else [None] * len(analyze_list)
+        return [(video_id, channel_id, published_at if isinstance(published_at, str) else None)
+                for video_id, channel_id, published_at
+                in zip(analyze_list["video_id"], analyze_list["channel_id"], published)]
+
+    def transcript_path(self, video_id, channel_id, extension=".seg"):
+        return os.path.join(self.transcripts_dir, channel_id, f"{video_id}{extension}")
+
+    def transcript_version(self, video_id, channel_id):
+        # changes whenever the stored transcript changes, None if there is no transcript
+        if self.store is not None:
+            location = self.store.location(video_id)
+            return None if location is None else ":".join(map(str, location[1:]))
+        if self.manifest is not None:
+            return self.manifest.version(video_id)
+
+        for extension in (".seg", ".txt"):
+            try:
+                stat = os.stat(self.transcript_path(video_id, channel_id, extension))
+            except FileNotFoundError:
+                continue
+            return f"{extension}:{stat.st_size}:{stat.st_mtime_ns}"
+        return None
+
+    def read_record(self, video_id, channel_id):
+        # Stored transcript bytes: structured record (`.seg`) or legacy `[m:ss] text` lines (`.txt`)
+        data = self._read_record(video_id, channel_id)
+        if data is None:
+            metrics.inc("transcripts_missing")
+        else:
+            metrics.inc("transcripts_read")
+            metrics.inc("transcript_bytes_read", len(data))
+            metrics.observe("transcript_bytes", len(data), BYTES_BUCKETS)
+        return data
+
+    def _read_record(self, video_id, channel_id):
+        if self.store is not None:
+            return self.store.read_bytes(video_id)
+        if self.manifest is not None:
+            path = self.manifest.path(video_id)
+            if path is None:
+                return None
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None  # removed since the manifest was refreshed
+
+        for extension in (".seg", ".txt"):
+            try:
+                with open(self.transcript_path(video_id, channel_id, extension), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        return None
+
+    def read_transcript(self, video_id, channel_id):
+        data = self.read_record(video_id, channel_id)
+        if data is None:
+            return None
+        if is_structured(data):
+            return decode_text(data)  # normalized at fetch time
+
+        text = str(data, "utf-8").lower()
+        return re.sub(r"\[\d+:\d+\]", "", text).strip()
+
+    def read_segments(self, video_id, channel_id):
+        # [(start_ms, duration_ms, text)] for time-aware analyses, None if there is no transcript
+        data = self.read_record(video_id, channel_id)
+        if data is None:
+            return None
+        if is_structured(data):
+            return decode_segments(data)
+        return segments_from_legacy(str(data, "utf-8"))
+
+    def iter_transcripts(self, with_channel=False):
+        """Yields (video_id, published_at, text) lazily, (video_id, channel_id, published_at, text) `with_channel`.
+
+        A background I/O thread reads at most `read_ahead` transcripts ahead of
+        the consumer, so memory depends on that window and not on the corpus.
+        """
+        rows = self.load_analyze_list()
+        self.total_files = len(rows)
+        if not rows:
+            return
+
+        if self.store is not None:
+            # physical order, so a cold scan is sequential I/O over the segment files
+            positions = {video_id: idx for idx, video_id in enumerate(self.store.scan_order(row[0] for row in rows))}
+            rows.sort(key=lambda row: positions[row[0]])
+
+        logging.info(f"📂 Found {self.total_files} files for analysis.")
+        window = queue.Queue(maxsize=self.read_ahead)
+        stop = threading.Event()
+
+        def put(item):
+            # blocks while the window is full, gives up once the consumer is gone
+            while not stop.is_set():
+                try:
+                    window.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
+            start_time = time.time()
+            try:
+                for idx, (video_id, channel_id, published_at) in enumerate(rows):
+                    with metrics.stage("read_transcript"):  # time spent waiting on the consumer is not counted
+                        text = self.read_transcript(video_id, channel_id)
+                    if text is None:
+                        logging.warning(f"⚠️ Missing transcript for  {video_id} ({channel_id})")
+                    elif not put((video_id, channel_id, published_at, text) if with_channel
+                                 else (video_id, published_at, text)):
+                        return
+
+                    if (idx + 1) % 10 == 0 or idx + 1 == self.total_files:
+                        elapsed_time = time.time() - start_time
+                        logging.info(f"📊 Processesd {idx + 1}/{self.total_files} files ({elapsed_time:.2f} s)")
+            except Exception as e:
+                put(e)
+            finally:
+                put(_END_OF_STREAM)
+
+        reader_thread = threading.Thread(target=reader, name="transcript-reader", daemon=True)
+        reader_thread.start()
+        try:
+            while True:
+                item = window.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            reader_thread.join()
 
+    def load_transcripts(self):
+        # Materializes the whole corpus, prefer `iter_transcripts` for large analyze lists
+        return list(self.iter_transcripts())
+
+    def close(self):
+        # Release resources held by the analyzer (pools, caches, corpus)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+        self.use_manifest = False
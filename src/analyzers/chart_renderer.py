@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.metrics import metrics
+
+RENDER_VERSION = 1  # bump when a chart layout changes, so cached charts are rendered again
+WORDCLOUD_TOP_K = 500  # WordCloud draws at most a few hundred words anyway
+DAILY_MAX_DAYS = 120  # longer ranges are plotted per week
+WEEKLY_MAX_DAYS = 730  # and per month above this
+MARKERS_MAX_POINTS = 60
+
+
+def choose_bucket(first, last):
+    days = (last - first).days
+    if days <= DAILY_MAX_DAYS:
+        return "day"
+    return "week" if days <= WEEKLY_MAX_DAYS else "month"
+
+
+def resample_trends(df, top_n):
+    """(bucket, wide frame: one row per bucket start, one column per top word) from a long (word, date, count) frame.
+
+    One pivot instead of a filter per word; days without a word count as zero.
+    """
+    import pandas as pd
+
+    wide = df.pivot_table(index="date", columns="word", values="count", aggfunc="sum", fill_value=0)
+    wide.index = pd.to_datetime(wide.index)
+    wide = wide[wide.sum().sort_values(ascending=False, kind="stable").index[:top_n]]
+
+    bucket = choose_bucket(wide.index.min(), wide.index.max())
+    rule = {"day": "D", "week": "W-MON", "month": "MS"}[bucket]
+    wide = wide.resample(rule, label="left", closed="left").sum()  # empty days / weeks / months become 0
+    return bucket, wide
+
+
+#################
+### RENDERERS ###
+#################
+# Run in the renderer process: matplotlib is imported there, on the Agg backend, and never shown
+
+def render_trends(path, dates, words, values, title, bucket):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    x = np.array(dates, dtype="datetime64[D]")
+    colors = matplotlib.colormaps["tab20"].resampled(max(len(words), 1))
+    marker = "o" if len(dates) <= MARKERS_MAX_POINTS else None
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for idx, word in enumerate(words):
+        ax.plot(x, [row[idx] for row in values], marker=marker, label=word, color=colors(idx))
+
+    locator = mdates.AutoDateLocator(minticks=4, maxticks=12)  # a handful of ticks, whatever the range
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax.set_xlabel(f"Date (per {bucket})")
+    ax.set_ylabel("Number of words")
+    ax.set_title(title)
+    ax.legend(loc="upper left", bbox_to_anchor=(1.01, 1))
+
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def render_wordcloud(path, frequencies, title):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
+
+    wordcloud = WordCloud(width=800, height=400, background_color="white",
+                          max_words=len(frequencies)).generate_from_frequencies(dict(frequencies))
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.imshow(wordcloud, interpolation="bilinear")
+    ax.axis("off")
+    ax.set_title(title)
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def render_bars(path, words, counts, title):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.bar(words, counts, color="blue")
+    ax.tick_params(axis="x", labelrotation=45)
+    plt.setp(ax.get_xticklabels(), ha="right")
+    ax.set_xlabel("Word")
+    ax.set_ylabel("Number of occurrences")
+    ax.set_title(title)
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+RENDERERS = {"trends": render_trends, "wordcloud": render_wordcloud, "bars": render_bars}
+
+
+def render_chart(kind, path, key, payload):
+    RENDERERS[kind](path, **payload)
+    with open(f"{path}.key", "w", encoding="utf-8") as f:
+        f.write(key)  # written last: a chart without its key is rendered again
+    return path
+
+
+class ChartRenderer:
+    """Renders charts headless in a separate process, skipping charts whose input data did not change.
+
+    A chart's key is a hash of its kind, input data and RENDER_VERSION, stored next to
+    the image as `<chart>.key`. `submit` returns at once, so the analysis keeps going
+    while matplotlib works; `wait` collects the results.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pending = []
+
+    def get_pool(self):
+        if self._pool is None:
+            # spawn: the analyzer may run NLP threads, forking them is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    @staticmethod
+    def chart_key(kind, payload):
+        data = json.dumps([RENDER_VERSION, kind, payload], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_cached(path, key):
+        if not os.path.exists(path) or not os.path.exists(f"{path}.key"):
+            return False
+        with open(f"{path}.key", "r", encoding="utf-8") as f:
+            return f.read().strip() == key
+
+    def submit(self, kind, path, **payload):
+        key = self.chart_key(kind, payload)
+        if self.is_cached(path, key):
+            metrics.inc("charts_cached")
+            logging.info(f"⚡ Chart data unchanged, keeping {path}")
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._pending.append((path, self.get_pool().submit(render_chart, kind, path, key, payload)))
+
+    def wait(self):
+        # number of charts that failed, rendering errors are logged and never raised
+        pending, self._pending = self._pending, []
+        failed = 0
+        for path, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                metrics.inc("charts_failed")
+                logging.error(f"🚨 Rendering {path} failed: {e}")
+                continue
+            metrics.inc("charts_rendered")
+            logging.info(f"✅ Saved chart to {path}")
+        return failed
+
+    def close(self):
+        self.wait()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
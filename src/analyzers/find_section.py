@@ -1,18 +1,63 @@
-import re
+import csv
 import logging
+import os
+
 from src.analyzers.base_analyzer import BaseAnalyzer
+from src.analyzers.section_index import SectionIndex, DEFAULT_SECTION_INDEX, format_timestamp
 
 class FindSectionAnalyzer(BaseAnalyzer):
 
-    def __init__(self, analyze_list_csv, transcripts_dir, keywords):
-        super().__init__(analyze_list_csv, transcripts_dir)
+    def __init__(self, analyze_list_csv, transcripts_dir, keywords, output_csv, index_path=DEFAULT_SECTION_INDEX,
+                 corpus_dir=None):
+        super().__init__(analyze_list_csv, transcripts_dir, corpus_dir=corpus_dir)
         self.keywords = keywords
+        self.output_csv = output_csv
+        self.index = SectionIndex(index_path)
 
     def analyze(self):
-        # todo: implement me
-        # given: keyword
-        # iterate over files (from input list)
-        # find occurs in transcript
-        # then: collect occurs
-        # export to csv
-        return
+        rows = self.load_analyze_list()
+        if not rows:
+            logging.warning("⚠️ No videos for analysis!")
+            return
+
+        # index is refreshed incrementally: only transcripts added or changed since the last run
+        self.index.update(((video_id, channel_id) for video_id, channel_id, _ in rows),
+                          self.transcript_version, self.read_segments)
+
+        videos = {video_id: (channel_id, published_at) for video_id, channel_id, published_at in rows}
+        sections = []
+        for keyword in self.keywords:
+            # several hits inside the same segment(s) give one section
+            matches = set(self.index.find_phrase(keyword, set(videos)))
+            for video_id, first_seg_no, last_seg_no in matches:
+                segments = self.index.segments(video_id, first_seg_no, last_seg_no)
+                channel_id, published_at = videos[video_id]
+                start_ms = segments[0][0]
+                end_ms = segments[-1][0] + segments[-1][1]
+                sections.append({
+                    "keyword": keyword,
+                    "video_id": video_id,
+                    "channel_id": channel_id,
+                    "published_at": published_at,
+                    "start_ms": start_ms,
+                    "end_ms": end_ms,
+                    "timestamp": format_timestamp(start_ms),
+                    "section": " ".join(text for _, _, text in segments),
+                })
+            logging.info(f"🔎 '{keyword}': {len(matches)} sections found")
+
+        sections.sort(key=lambda section: (section["keyword"], section["published_at"] or "",
+                                           section["video_id"], section["start_ms"]))
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_csv)), exist_ok=True)
+        headers = ["keyword", "video_id", "channel_id", "published_at", "start_ms", "end_ms", "timestamp", "section"]
+        with open(self.output_csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=headers, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(sections)
+
+        logging.info(f"✅ Saved {len(sections)} sections to {self.output_csv}")
+
+    def close(self):
+        super().close()
+        self.index.close()
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+DEFAULT_LEMMA_CACHE = os.path.join(BASE_DIR, "output", "lemma_cache.sqlite")
+COMMIT_EVERY = 100  # puts per transaction, a crash loses at most that many entries
+
+
+class LemmaCache:
+    """Persistent per-video lemma cache.
+
+    Entries are keyed by video_id and a content key: a hash of the normalized
+    transcript text plus a fingerprint of everything that changes NLP output
+    (stopword set, pipeline config). A changed transcript or config is a miss.
+    Puts are committed every COMMIT_EVERY videos and on `close`, not one fsync per video.
+    """
+
+    def __init__(self, cache_path=DEFAULT_LEMMA_CACHE, fingerprint=""):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._uncommitted = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS lemmas ("
+                "video_id TEXT PRIMARY KEY, "
+                "content_key TEXT NOT NULL, "
+                "lemmas TEXT NOT NULL)"
+            )
+        logging.info(f"📌 Lemma cache opened: {cache_path}")
+
+    @staticmethod
+    def make_fingerprint(stopwords, pipeline_config):
+        digest = hashlib.sha1()
+        digest.update(repr(sorted(pipeline_config.items())).encode("utf-8"))
+        digest.update("\n".join(sorted(stopwords)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def content_key(self, text):
+        digest = hashlib.sha1(self.fingerprint.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, video_id, text):
+        key = self.content_key(text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_key, lemmas FROM lemmas WHERE video_id = ?", (video_id,)
+            ).fetchone()
+
+        if row is None or row[0] != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # lemmas never span lines, so a newline-joined string is a compact encoding
+        return row[1].split("\n") if row[1] else []
+
+    def put(self, video_id, text, lemmas):
+        key = self.content_key(text)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lemmas (video_id, content_key, lemmas) VALUES (?, ?, ?)",
+                (video_id, key, "\n".join(lemmas)),
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self._commit()
+
+    def _commit(self):
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+        logging.info(f"📊 Lemma cache: {self.hits} hits, {self.misses} misses")
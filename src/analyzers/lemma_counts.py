@@ -0,0 +1,53 @@
+import heapq
+from array import array
+from collections import Counter
+
+
+class LemmaCounts:
+    """Running lemma totals, int-coded: every distinct lemma is stored once and counted in an array.
+
+    Per-text (or per-chunk) results are merged as soon as they arrive and then dropped,
+    so memory follows the vocabulary size, not the number of tokens in the corpus.
+    """
+
+    def __init__(self):
+        self.ids = {}  # lemma -> id
+        self.lemmas = []  # id -> lemma
+        self.counts = array("q")  # id -> count
+        self.total = 0  # all counted lemmas (tokens)
+
+    def __len__(self):
+        return len(self.lemmas)
+
+    def encode(self, lemmas):
+        # Counter of lemma ids, new lemmas get the next free id
+        ids = self.ids
+        encoded = Counter()
+        for lemma, count in Counter(lemmas).items():
+            lemma_id = ids.get(lemma)
+            if lemma_id is None:
+                lemma_id = ids[lemma] = len(self.lemmas)
+                self.lemmas.append(lemma)
+                self.counts.append(0)
+            encoded[lemma_id] = count
+        return encoded
+
+    def merge(self, encoded):
+        counts = self.counts
+        for lemma_id, count in encoded.items():
+            counts[lemma_id] += count
+            self.total += count
+
+    def add(self, lemmas):
+        self.merge(self.encode(lemmas))
+
+    def most_common(self, n=None):
+        """[(lemma, count)] by descending count, like `Counter.most_common`."""
+        if n is None:
+            order = sorted(range(len(self.counts)), key=self.counts.__getitem__, reverse=True)
+        else:
+            order = heapq.nlargest(n, range(len(self.counts)), key=self.counts.__getitem__)
+        return [(self.lemmas[lemma_id], self.counts[lemma_id]) for lemma_id in order]
+
+    def items(self):
+        return zip(self.lemmas, self.counts)
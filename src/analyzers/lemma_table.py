@@ -0,0 +1,97 @@
+import gzip
+import logging
+import os
+import re
+import threading
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+DEFAULT_LEMMA_TABLE = os.path.join(BASE_DIR, "output", "lemma_table.tsv.gz")
+
+# Cheap tokenizer for the fast backend: words (with inner hyphens) and numbers
+TOKEN_RE = re.compile(r"\w+(?:-\w+)*")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text)
+
+
+def doc_forms(doc):
+    # (lowercased surface form, lemmas) of every token of a Stanza document
+    for sentence in doc.sentences:
+        for token in sentence.tokens:
+            yield token.text.lower(), [word.lemma.lower() for word in token.words if word.lemma]
+
+
+class LemmaTable:
+    """Surface form -> lemma(s) table learned from Stanza output.
+
+    A form maps to a tuple of lemmas, because multi-word tokens (e.g. "żebyśmy")
+    expand to several words. The first observed mapping wins, so lookups are
+    stable between runs. On disk: gzipped `form<TAB>lemma lemma` lines, with an
+    empty lemma column when the only lemma equals the form.
+    """
+
+    def __init__(self, table_path=DEFAULT_LEMMA_TABLE):
+        self.table_path = table_path
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def __len__(self):
+        return len(self.table)
+
+    def load(self):
+        if not os.path.exists(self.table_path):
+            logging.info(f"📌 No lemma table at {self.table_path}, starting empty")
+            return
+
+        with gzip.open(self.table_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                form, _, lemmas = line.rstrip("\n").partition("\t")
+                self.table[form] = tuple(lemmas.split(" ")) if lemmas else (form,)
+
+        logging.info(f"📌 Loaded lemma table with {len(self.table)} forms from {self.table_path}")
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.table_path)), exist_ok=True)
+        tmp_path = self.table_path + ".tmp"
+        with self._lock:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for form, lemmas in self.table.items():
+                    column = "" if lemmas == (form,) else " ".join(lemmas)
+                    f.write(f"{form}\t{column}\n")
+            os.replace(tmp_path, self.table_path)
+            self._dirty = False
+
+        logging.info(f"✅ Saved lemma table with {len(self.table)} forms to {self.table_path}")
+
+    def learn(self, form, lemmas):
+        if not lemmas or not TOKEN_RE.fullmatch(form) or any(" " in lemma or "\t" in lemma for lemma in lemmas):
+            return
+
+        with self._lock:
+            if form not in self.table:
+                self.table[form] = tuple(lemmas)
+                self._dirty = True
+
+    def learn_from_doc(self, doc):
+        for form, lemmas in doc_forms(doc):
+            self.learn(form, lemmas)
+
+    def missing(self, forms):
+        return sorted({form for form in forms if form not in self.table})
+
+    def lookup(self, form):
+        lemmas = self.table.get(form)
+        if lemmas is None:
+            self.misses += 1
+            return (form,)
+
+        self.hits += 1
+        return lemmas
@@ -0,0 +1,124 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from src.metrics import metrics
+
+DEFAULT_BATCH_CHARS = 100_000  # ~20 chunks of 5000 characters per worker task
+DEFAULT_WINDOW_CHARS = 8_000_000  # transcripts read ahead and packed together
+
+
+class _Job:
+    __slots__ = ("tag", "text", "chunks", "results", "remaining", "error")
+
+    def __init__(self, tag, text, chunks):
+        self.tag = tag
+        self.text = text
+        self.chunks = chunks  # dropped once packed
+        self.results = [None] * len(chunks)
+        self.remaining = len(chunks)
+        self.error = None
+
+
+class ChunkScheduler:
+    """Corpus-wide NLP scheduler on the analyzer's long-lived executor.
+
+    Transcripts are read in windows of about `window_chars` characters. The chunks of
+    a window are ordered largest video first and packed into batches of about
+    `batch_chars`, so one task is roughly as expensive as any other and long videos
+    are started early instead of holding up the tail. The next window is read and
+    packed while the last batches of the current one are still running, and at most
+    `max_in_flight` batches are submitted at a time, which bounds memory. A failed
+    batch of several videos is retried per video, so one bad transcript fails alone.
+    """
+
+    def __init__(self, analyzer, chunk_size=5000, batch_chars=DEFAULT_BATCH_CHARS,
+                 window_chars=DEFAULT_WINDOW_CHARS, max_in_flight=None):
+        self.analyzer = analyzer
+        self.chunk_size = chunk_size
+        self.batch_chars = max(batch_chars, chunk_size)
+        self.window_chars = window_chars
+        self.max_in_flight = max_in_flight or 2 * analyzer.num_workers  # one queued batch per worker
+
+    def pack(self, jobs):
+        """Batches of (job, chunk_no, chunk), largest video first, each about `batch_chars` long."""
+        batches, batch, batch_chars = [], [], 0
+        for job in sorted(jobs, key=lambda job: len(job.text), reverse=True):
+            for chunk_no, chunk in enumerate(job.chunks):
+                if batch and batch_chars + len(chunk) > self.batch_chars:
+                    batches.append(batch)
+                    batch, batch_chars = [], 0
+                batch.append((job, chunk_no, chunk))
+                batch_chars += len(chunk)
+            job.chunks = None
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def read_window(self, items):
+        # (jobs, exhausted); chunks are cut up front so a job knows when all of them are done
+        jobs, window_chars = [], 0
+        for tag, text in items:
+            jobs.append(_Job(tag, text, self.analyzer.split_text_into_chunks(text, self.chunk_size)))
+            window_chars += len(text)
+            if window_chars >= self.window_chars:
+                return jobs, False
+        return jobs, True
+
+    def run(self, items):
+        """Lemmatizes `items`, (tag, text) pairs, yields (tag, text, lemmas, error) as each text completes.
+
+        Results come in completion order; `lemmas` is in text order, or None if a batch
+        holding one of its chunks failed (then `error` is that exception).
+        """
+        items = iter(items)
+        queue = deque()
+        in_flight = {}
+        exhausted = False
+
+        try:
+            while True:
+                if not queue and not exhausted:
+                    jobs, exhausted = self.read_window(items)
+                    for job in jobs:
+                        if not job.remaining:
+                            yield job.tag, job.text, [], None  # empty transcript
+                    queue.extend(self.pack(job for job in jobs if job.remaining))
+
+                while queue and len(in_flight) < self.max_in_flight:
+                    batch = queue.popleft()
+                    in_flight[self.analyzer.submit_clean_text([chunk for _, _, chunk in batch])] = batch
+                    metrics.inc("nlp_batches")
+                    metrics.observe("nlp_batch_chunks", len(batch), (1, 2, 5, 10, 20, 50, 100))
+
+                if not in_flight:
+                    if exhausted and not queue:
+                        return
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    try:
+                        results, error = self.analyzer.clean_text_results(future), None
+                    except Exception as e:
+                        results, error = None, e
+
+                    jobs = {id(job): job for job, _, _ in batch}
+                    if error is not None and len(jobs) > 1:
+                        # packed videos fail alone, as they did when every video was processed on its own
+                        for job_id in jobs:
+                            queue.appendleft([piece for piece in batch if id(piece[0]) == job_id])
+                        continue
+
+                    for idx, (job, chunk_no, _) in enumerate(batch):
+                        if error is not None:
+                            job.error = job.error or error
+                        else:
+                            job.results[chunk_no] = results[idx]
+                        job.remaining -= 1
+                        if not job.remaining:
+                            lemmas = None if job.error else [lemma for chunk in job.results for lemma in chunk]
+                            yield job.tag, job.text, lemmas, job.error
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,41 @@
+import logging
+
+from src.analyzers.lemma_table import doc_forms
+from src.analyzers.stanza_base_analyzer import build_pipeline, lemmatize_documents
+
+# Per-process state, built once by `init_worker` (ProcessPoolExecutor initializer)
+_nlp = None
+_stopwords = frozenset()
+
+
+def init_worker(model_dir, stopwords, batch_sizes):
+    global _nlp, _stopwords
+
+    # one torch thread per worker, parallelism comes from the number of processes
+    import torch
+    torch.set_num_threads(1)
+
+    _stopwords = frozenset(stopwords)
+    # models are downloaded by the parent process (or already present offline)
+    _nlp = build_pipeline(model_dir, offline=True, use_gpu=False, **batch_sizes)
+    logging.info("✅ Stanza NLP loaded in worker process")
+
+
+class FormCollector:
+    # Stands in for the parent's LemmaTable: the (form, lemmas) pairs of a batch are sent back and learned there
+    def __init__(self):
+        self.forms = {}
+
+    def learn_from_doc(self, doc):
+        for form, lemmas in doc_forms(doc):
+            self.forms.setdefault(form, tuple(lemmas))
+
+
+def lemmatize_batch(texts, learn=False):
+    """(one newline-joined lemma string per text, [(form, lemmas)] for the lemma table, empty unless `learn`).
+
+    Joined strings are a compact result, instead of pickled lists of str.
+    """
+    collector = FormCollector() if learn else None
+    results = ["\n".join(lemmas) for lemmas in lemmatize_documents(_nlp, texts, _stopwords, collector)]
+    return results, list(collector.forms.items()) if collector is not None else []
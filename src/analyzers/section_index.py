@@ -0,0 +1,137 @@
+import logging
+import os
+import sqlite3
+from array import array
+
+from src.analyzers.lemma_table import tokenize
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+DEFAULT_SECTION_INDEX = os.path.join(BASE_DIR, "output", "section_index.sqlite")
+
+def format_timestamp(start_ms):
+    minutes, seconds = divmod(start_ms // 1000, 60)
+    return f"[{minutes}:{seconds:02d}]"
+
+
+class SectionIndex:
+    """Persistent positional inverted index over transcripts.
+
+    postings: (term, video_id) -> packed uint32 pairs of (token position, segment number),
+    segments: (video_id, segment number) -> start and duration in milliseconds, text.
+    Videos are re-indexed only when their transcript version (file size and mtime,
+    or packed corpus location) changes.
+    """
+
+    def __init__(self, index_path=DEFAULT_SECTION_INDEX):
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(index_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs (video_id TEXT PRIMARY KEY, version TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS segments (video_id TEXT NOT NULL, seg_no INTEGER NOT NULL,"
+            " start_ms INTEGER NOT NULL, duration_ms INTEGER NOT NULL, text TEXT NOT NULL,"
+            " PRIMARY KEY (video_id, seg_no)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, video_id TEXT NOT NULL, positions BLOB NOT NULL,"
+            " PRIMARY KEY (term, video_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_postings_video ON postings (video_id);"
+        )
+
+    def is_current(self, video_id, version):
+        row = self._conn.execute("SELECT version FROM docs WHERE video_id = ?", (video_id,)).fetchone()
+        return row is not None and row[0] == version
+
+    def remove(self, video_id):
+        self._conn.execute("DELETE FROM postings WHERE video_id = ?", (video_id,))
+        self._conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+        self._conn.execute("DELETE FROM docs WHERE video_id = ?", (video_id,))
+
+    def add(self, video_id, segments, version):
+        self.remove(video_id)
+
+        postings = {}
+        position = 0
+        for seg_no, (_, _, text) in enumerate(segments):
+            for term in tokenize(text.lower()):
+                postings.setdefault(term, array("I")).extend((position, seg_no))
+                position += 1
+
+        self._conn.executemany(
+            "INSERT INTO segments (video_id, seg_no, start_ms, duration_ms, text) VALUES (?, ?, ?, ?, ?)",
+            [(video_id, seg_no, *segment) for seg_no, segment in enumerate(segments)],
+        )
+        self._conn.executemany("INSERT INTO postings (term, video_id, positions) VALUES (?, ?, ?)",
+                               [(term, video_id, positions.tobytes()) for term, positions in postings.items()])
+        self._conn.execute("INSERT INTO docs (video_id, version) VALUES (?, ?)", (video_id, version))
+
+    def update(self, videos, get_version, read_segments):
+        """Indexes new or changed transcripts.
+
+        `videos` yields (video_id, channel_id); `get_version` and `read_segments` take the
+        same pair and return the transcript version and its segments (None if missing).
+        """
+        added = unchanged = 0
+        for video_id, channel_id in videos:
+            version = get_version(video_id, channel_id)
+            if version is None:
+                continue
+
+            if self.is_current(video_id, version):
+                unchanged += 1
+                continue
+
+            segments = read_segments(video_id, channel_id)
+            if segments is None:
+                continue
+            self.add(video_id, segments, version)
+            added += 1
+            if added % 500 == 0:
+                self._conn.commit()
+                logging.info(f"📊 Indexed {added} transcripts...")
+
+        self._conn.commit()
+        logging.info(f"✅ Section index updated: {added} (re)indexed, {unchanged} unchanged")
+
+    def postings(self, term, video_ids=None):
+        # {video_id: [(position, seg_no), ...]}
+        result = {}
+        for video_id, blob in self._conn.execute("SELECT video_id, positions FROM postings WHERE term = ?", (term,)):
+            if video_ids is not None and video_id not in video_ids:
+                continue
+            packed = array("I")
+            packed.frombytes(blob)
+            result[video_id] = list(zip(packed[0::2], packed[1::2]))
+        return result
+
+    def find_phrase(self, phrase, video_ids=None):
+        """Yields (video_id, first_seg_no, last_seg_no) for every occurrence of the phrase."""
+        terms = tokenize(phrase.lower())
+        if not terms:
+            return
+
+        candidates = self.postings(terms[0], video_ids)
+        following = []
+        for term in terms[1:]:
+            term_postings = self.postings(term, set(candidates))
+            candidates = {video_id: hits for video_id, hits in candidates.items() if video_id in term_postings}
+            following.append({video_id: dict(hits) for video_id, hits in term_postings.items()})
+
+        for video_id, hits in candidates.items():
+            for position, seg_no in hits:
+                last_seg_no = seg_no
+                for offset, term_positions in enumerate(following, 1):
+                    last_seg_no = term_positions[video_id].get(position + offset)
+                    if last_seg_no is None:
+                        break
+                else:
+                    yield video_id, seg_no, last_seg_no
+
+    def segments(self, video_id, first_seg_no, last_seg_no):
+        return self._conn.execute(
+            "SELECT start_ms, duration_ms, text FROM segments WHERE video_id = ? AND seg_no BETWEEN ? AND ? ORDER BY seg_no",
+            (video_id, first_seg_no, last_seg_no),
+        ).fetchall()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
@@ -1,26 +1,162 @@
 import logging
+import multiprocessing
 import os
-import time
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-import stanza
 from stopwordsiso import stopwords
 
 from src.analyzers.base_analyzer import BaseAnalyzer
+from src.analyzers.lemma_cache import LemmaCache, DEFAULT_LEMMA_CACHE
+from src.analyzers.lemma_table import LemmaTable, DEFAULT_LEMMA_TABLE, tokenize
 from src.common_logging import setup_logging
+from src.metrics import metrics
 
 setup_logging()
 
+PIPELINE_CONFIG = {"lang": "pl", "processors": "tokenize,mwt,pos,lemma"}
+EXECUTORS = ("thread", "process")
+BACKENDS = ("stanza", "fast", "stub")  # 'stub' needs no models: benchmarks and smoke runs only
+OOV_BATCH_SIZE = 1000  # out-of-vocabulary forms per Stanza call in the fast backend
+# Same default as Stanza itself, resolved without importing stanza
+DEFAULT_MODEL_DIR = os.getenv("STANZA_RESOURCES_DIR", os.path.join(os.path.expanduser("~"), "stanza_resources"))
+# Stanza processor batch sizes, they affect throughput and peak memory, not the output
+DEFAULT_BATCH_SIZES = {"tokenize_batch_size": 32, "mwt_batch_size": 50, "pos_batch_size": 1000, "lemma_batch_size": 50}
+DEFAULT_DOCS_PER_BATCH = 64
+
+
+def keep_lemma(lemma, stopwords_set):
+    return lemma not in stopwords_set and len(lemma) > 2
+
+
+def extract_lemmas(doc, stopwords_set):
+    # Lowercased lemmas of a Stanza document, without stop words and very short words
+    processed_words = []
+    for sentence in doc.sentences:
+        for word in sentence.words:
+            lemma = word.lemma.lower()
+            if keep_lemma(lemma, stopwords_set):
+                processed_words.append(lemma)
+    return processed_words
+
+
+def build_pipeline(model_dir, offline=False, **options):
+    # stanza (and torch) are imported here, so cached runs and `--help` never pay for them
+    import stanza
+
+    if offline:
+        if not os.path.exists(os.path.join(model_dir, "resources.json")):
+            raise FileNotFoundError(f"Offline mode: no Stanza models in {model_dir}")
+    else:
+        stanza.download(PIPELINE_CONFIG["lang"], model_dir=model_dir)
+
+    return stanza.Pipeline(PIPELINE_CONFIG["lang"],
+                           dir=model_dir,
+                           processors=PIPELINE_CONFIG["processors"],
+                           download_method=None,  # models are already in `model_dir`
+                           **options)
+
+
+def lemmatize_documents(nlp, texts, stopwords_set, lemma_table=None):
+    # One bulk Stanza call with every text as a separate document, one lemma list per text
+    import stanza
+
+    docs = [stanza.Document([], text=text) for text in texts if text]
+    processed = iter(nlp.bulk_process(docs) if docs else [])
+
+    results = []
+    for text in texts:
+        if not text:
+            results.append([])
+            continue
+
+        doc = next(processed)
+        metrics.inc("tokens", doc.num_words)  # in worker processes this stays in the worker's registry
+        if lemma_table is not None:
+            lemma_table.learn_from_doc(doc)  # every Stanza pass also feeds the fast backend
+        results.append(extract_lemmas(doc, stopwords_set))
+    return results
+
+
+# Stub backend: regex tokens with a few common Polish endings cut off, deterministic and model free
+STUB_SUFFIXES = ("ami", "ach", "owi", "ego", "emu", "ów", "om", "ie", "a", "y", "u", "e")
+
+
+def stub_lemma(form):
+    for suffix in STUB_SUFFIXES:
+        if form.endswith(suffix) and len(form) - len(suffix) >= 3:
+            return form[:-len(suffix)]
+    return form
+
+
+def split_into_batches(items, batch_size):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
 class StanzaBaseAnalyzer(BaseAnalyzer):
 
-    def __init__(self, analyze_list_csv, transcripts_dir):
-        super().__init__(analyze_list_csv, transcripts_dir)
+    def __init__(self, analyze_list_csv, transcripts_dir, lemma_cache_path=DEFAULT_LEMMA_CACHE,
+                 executor="thread", num_workers=4, batch_sizes=None, docs_per_batch=DEFAULT_DOCS_PER_BATCH,
+                 backend="stanza", lemma_table_path=DEFAULT_LEMMA_TABLE,
+                 model_dir=DEFAULT_MODEL_DIR, offline=False, use_gpu=True, corpus_dir=None):
+        super().__init__(analyze_list_csv, transcripts_dir, corpus_dir=corpus_dir)
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', expected one of {EXECUTORS}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+        self.executor = executor
+        self.num_workers = num_workers
+        self.batch_sizes = {**DEFAULT_BATCH_SIZES, **(batch_sizes or {})}
+        self.docs_per_batch = docs_per_batch
+        self.backend = backend
+        self.model_dir = model_dir
+        self.offline = offline
+        self.use_gpu = use_gpu
+        self._process_pool = None
+        self._thread_pool = None
+        self._nlp = None
+        self._forms_nlp = None
+        self._nlp_lock = threading.Lock()
         self.stopwords = self.load_stopwords()
 
-        # ✅ Initialize Stanza only once
-        start_time = time.time()
-        stanza.download("pl")
-        self.nlp = stanza.Pipeline("pl", processors="tokenize,mwt,pos,lemma", use_gpu=True)
-        logging.info(f"✅ Stanza NLP loaded in {time.time() - start_time:.2f}s")
+        # ✅ Surface form -> lemma table: learned by the Stanza backend, used by the fast one
+        self.lemma_table_path = lemma_table_path
+        self._lemma_table = None
+        self._lemma_table_lock = threading.Lock()
+        if self.backend == "fast" and not lemma_table_path:
+            raise ValueError("The fast backend requires a lemma table path")
+
+        # ✅ Everything that changes NLP output; the fast backend may lemmatize differently
+        config = PIPELINE_CONFIG if self.backend == "stanza" else {**PIPELINE_CONFIG, "backend": self.backend}
+        self.nlp_fingerprint = LemmaCache.make_fingerprint(self.stopwords, config)
+
+        # ✅ Per-video lemma cache (None disables it)
+        self.lemma_cache = LemmaCache(lemma_cache_path, self.nlp_fingerprint) if lemma_cache_path else None
+
+    @property
+    def nlp(self):
+        # ✅ Stanza is loaded lazily, on the first cache miss, and only once
+        if self._nlp is None:
+            with self._nlp_lock:
+                if self._nlp is None:
+                    self._nlp = self.load_pipeline()
+        return self._nlp
+
+    @property
+    def lemma_table(self):
+        # ✅ Loaded lazily as well, runs served from the lemma cache never decompress it
+        if self._lemma_table is None and self.lemma_table_path:
+            with self._lemma_table_lock:
+                if self._lemma_table is None:
+                    self._lemma_table = LemmaTable(self.lemma_table_path)
+        return self._lemma_table
+
+    def load_pipeline(self, **options):
+        with metrics.stage("nlp_load") as timer:
+            nlp = build_pipeline(self.model_dir, self.offline, use_gpu=self.use_gpu, **self.batch_sizes, **options)
+        logging.info(f"✅ Stanza NLP loaded in {timer.elapsed:.2f}s")
+        return nlp
 
     def load_stopwords(self):
         # Loading stopwords from `stopwordsiso` + `config/stopwords_pl.txt`
@@ -41,18 +177,175 @@ class StanzaBaseAnalyzer(BaseAnalyzer):
             return []
 
         logging.info("🔄 Starting NLP...")
-        docs = self.nlp("\n".join(texts))
-
-        processed_words = []
-        for sentence in docs.sentences:
-            for word in sentence.words:
-                lemma = word.lemma.lower()
-                if lemma not in self.stopwords and len(lemma) > 2:
-                    processed_words.append(lemma)
+        processed_words = [word for lemmas in self.lemmatize_documents(texts) for word in lemmas]
 
         logging.info(f"✅ Ended NLP analysis. Found {len(processed_words)} words.")
         return processed_words
 
+    def lemmatize_documents(self, texts):
+        """Runs many texts through Stanza as separate documents, one lemma list per text.
+
+        Documents are sent in bulk batches of `docs_per_batch`, so no giant joined
+        string is built and results stay attributable to their source text.
+        """
+        if self.backend == "fast":
+            yield from self.fast_lemmatize_documents(texts)
+            return
+        if self.backend == "stub":
+            for text in texts:
+                tokens = tokenize(text.lower())
+                metrics.inc("tokens", len(tokens))
+                yield [lemma for lemma in map(stub_lemma, tokens) if keep_lemma(lemma, self.stopwords)]
+            return
+
+        for batch in split_into_batches(texts, self.docs_per_batch):
+            yield from lemmatize_documents(self.nlp, batch, self.stopwords, self.lemma_table)
+
+    def fast_lemmatize_documents(self, texts):
+        """Regex tokenizer + lemma table lookup, Stanza only for out-of-vocabulary forms."""
+        tokenized = [tokenize(text) for text in texts]
+        metrics.inc("tokens", sum(map(len, tokenized)))
+        oov_forms = self.lemma_table.missing(form for tokens in tokenized for form in tokens)
+        if oov_forms:
+            self.lemmatize_forms(oov_forms)
+
+        for tokens in tokenized:
+            yield [lemma
+                   for form in tokens
+                   for lemma in self.lemma_table.lookup(form)
+                   if keep_lemma(lemma, self.stopwords)]
+
+    def get_forms_nlp(self):
+        # Pretokenized pipeline: every out-of-vocabulary form is a one-token sentence
+        if self._forms_nlp is None:
+            with self._nlp_lock:
+                if self._forms_nlp is None:
+                    self._forms_nlp = self.load_pipeline(tokenize_pretokenized=True)
+        return self._forms_nlp
+
+    def lemmatize_forms(self, forms):
+        logging.info(f"🔄 Lemma table: {len(forms)} new forms sent to Stanza")
+        metrics.inc("lemma_table_oov_forms", len(forms))
+        nlp = self.get_forms_nlp()
+        for batch in split_into_batches(forms, OOV_BATCH_SIZE):
+            doc = nlp([[form] for form in batch])
+            for form, sentence in zip(batch, doc.sentences):
+                lemmas = [word.lemma.lower() for word in sentence.words if word.lemma]
+                self.lemma_table.learn(form, lemmas or [form])
+
+
+    def get_process_pool(self):
+        # Long-lived pool, workers load their own Stanza pipeline once in the initializer
+        if self._process_pool is None:
+            from src.analyzers.nlp_worker import init_worker
+
+            if not self.offline:
+                import stanza
+                stanza.download(PIPELINE_CONFIG["lang"], model_dir=self.model_dir)  # once, not per worker
+
+            logging.info(f"🔄 Starting {self.num_workers} NLP worker processes...")
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),  # no forking of torch state
+                initializer=init_worker,
+                initargs=(self.model_dir, tuple(self.stopwords), self.batch_sizes),
+            )
+        return self._process_pool
+
+    def get_thread_pool(self):
+        # Long-lived as well: per-call pools made every short video pay the pool setup
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="nlp")
+        return self._thread_pool
+
+    def submit_clean_text(self, texts):
+        """Future of one batch of texts on the configured executor, read it with `clean_text_results`."""
+        metrics.inc("nlp_texts", len(texts))
+        metrics.inc("nlp_chars", sum(map(len, texts)))
+        if self.backend in ("fast", "stub"):
+            # table lookups are cheap and the table lives in this process
+            future = Future()
+            try:
+                future.set_result(list(self.lemmatize_documents(texts)))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self.executor == "process":
+            from src.analyzers.nlp_worker import lemmatize_batch
+
+            return self.get_process_pool().submit(lemmatize_batch, texts, bool(self.lemma_table_path))
+        return self.get_thread_pool().submit(lambda: list(self.lemmatize_documents(texts)))
+
+    def clean_text_results(self, future):
+        # one lemma list per submitted text, raises the batch's error
+        results = future.result()
+        if self.executor == "process" and self.backend not in ("fast", "stub"):
+            results, forms = results  # see `lemmatize_batch`
+            results = [result.split("\n") if result else [] for result in results]
+            if forms and self.lemma_table is not None:
+                for form, lemmas in forms:  # learned here, as the thread mode does in `lemmatize_documents`
+                    self.lemma_table.learn(form, lemmas)
+        metrics.inc("lemmas", sum(map(len, results)))
+        return results
+
+    def imap_clean_text(self, texts, max_workers=None):
+        """Yields (index in `texts`, lemma list) as soon as the worker batch holding the text completes.
+
+        Consumers that only aggregate should use this: a slow batch does not hold back
+        the results of the batches behind it.
+        """
+        max_workers = max_workers or self.num_workers
+        # keep every worker busy when there are only a few texts
+        batch_size = max(1, min(self.docs_per_batch, -(-len(texts) // max_workers)))
+
+        if self.backend in ("fast", "stub"):
+            # in-process and lazy, one text at a time
+            metrics.inc("nlp_texts", len(texts))
+            metrics.inc("nlp_chars", sum(map(len, texts)))
+            for index, lemmas in enumerate(self.lemmatize_documents(texts)):
+                metrics.inc("lemmas", len(lemmas))
+                yield index, lemmas
+            return
+
+        futures = {self.submit_clean_text(texts[start:start + batch_size]): start
+                   for start in range(0, len(texts), batch_size)}
+        try:
+            for future in as_completed(futures):
+                start = futures[future]
+                for offset, result in enumerate(self.clean_text_results(future)):
+                    yield start + offset, result
+        finally:
+            for future in futures:
+                future.cancel()  # the consumer stopped early, batches not started yet are dropped
+
+    def close(self):
+        super().close()
+        if self._lemma_table is not None:
+            logging.info(f"📊 Lemma table: {self._lemma_table.hits} hits, {self._lemma_table.misses} misses")
+            metrics.inc("lemma_table_hits", self._lemma_table.hits)
+            metrics.inc("lemma_table_misses", self._lemma_table.misses)
+            self._lemma_table.save()
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(cancel_futures=True)
+            self._thread_pool = None
+        if self.lemma_cache is not None:
+            self.lemma_cache.close()
+            self.lemma_cache = None
+
+    def get_cached_lemmas(self, video_id, text):
+        if self.lemma_cache is None:
+            return None
+        lemmas = self.lemma_cache.get(video_id, text)
+        metrics.inc("lemma_cache_misses" if lemmas is None else "lemma_cache_hits")
+        return lemmas
+
+    def store_lemmas(self, video_id, text, lemmas):
+        if self.lemma_cache is not None:
+            self.lemma_cache.put(video_id, text, lemmas)
 
     def split_text_into_chunks(self, text, max_chunk_size=5000):
         chunks = []
@@ -0,0 +1,102 @@
+import csv
+import logging
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class SparseTrendMatrix:
+    """Integer-coded word x date count matrix in CSR form (NumPy only).
+
+    Words and dates are mapped to int ids (rows sorted alphabetically, columns
+    chronologically); only non-zero cells are stored. Exports stream one row
+    at a time, only small top-N views are ever made dense.
+    """
+
+    def __init__(self, vocabulary, dates, indptr, indices, data):
+        self.vocabulary = vocabulary  # row id -> word
+        self.dates = dates  # column id -> YYYY-MM-DD
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        row_of_cell = np.repeat(np.arange(len(vocabulary)), np.diff(indptr))
+        self.totals = np.bincount(row_of_cell, weights=data, minlength=len(vocabulary)).astype(np.int64)
+
+    @classmethod
+    def from_counts(cls, rows):
+        """Builds the matrix from an iterable of (word, date, count) triples."""
+        word_ids, date_ids = {}, {}
+        row_codes, col_codes, counts = array("q"), array("q"), array("q")
+        for word, date, count in rows:
+            row_codes.append(word_ids.setdefault(word, len(word_ids)))
+            col_codes.append(date_ids.setdefault(date, len(date_ids)))
+            counts.append(count)
+
+        vocabulary = np.array(list(word_ids), dtype=object)
+        dates = np.array(list(date_ids), dtype=object)
+        row_codes = np.frombuffer(row_codes, dtype=np.int64)
+        col_codes = np.frombuffer(col_codes, dtype=np.int64)
+        counts = np.frombuffer(counts, dtype=np.int64)
+
+        # re-code rows alphabetically and columns chronologically
+        word_order, date_order = np.argsort(vocabulary), np.argsort(dates)
+        word_rank = np.empty_like(word_order)
+        word_rank[word_order] = np.arange(len(word_order))
+        date_rank = np.empty_like(date_order)
+        date_rank[date_order] = np.arange(len(date_order))
+        row_codes, col_codes = word_rank[row_codes], date_rank[col_codes]
+
+        # sum duplicated cells, sorted by (row, column)
+        keys, inverse = np.unique(row_codes * max(len(dates), 1) + col_codes, return_inverse=True)
+        data = np.bincount(inverse, weights=counts).astype(np.int64)
+        rows_sorted, cols_sorted = np.divmod(keys, max(len(dates), 1))
+
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows_sorted, minlength=len(vocabulary)), out=indptr[1:])
+
+        matrix = cls(vocabulary[word_order], dates[date_order], indptr, cols_sorted, data)
+        logging.info(f"📊 Trend matrix: {len(matrix.vocabulary)} words x {len(matrix.dates)} dates, "
+                     f"{len(matrix.data)} non-zero cells")
+        return matrix
+
+    def select_rows(self, top_k=None, min_total=None):
+        # Row ids kept after pruning, in alphabetical order
+        rows = np.arange(len(self.vocabulary))
+        if min_total:
+            rows = rows[self.totals >= min_total]
+        if top_k and len(rows) > top_k:
+            rows = np.sort(rows[np.argsort(-self.totals[rows], kind="stable")[:top_k]])
+        return rows
+
+    def top_words(self, n):
+        return [self.vocabulary[row] for row in np.argsort(-self.totals, kind="stable")[:n]]
+
+    def top_frame(self, n):
+        # Small dense view for plotting: long (word, date, count) frame of the top-N words
+        records = []
+        for row in np.argsort(-self.totals, kind="stable")[:n]:
+            start, end = self.indptr[row], self.indptr[row + 1]
+            word = self.vocabulary[row]
+            records.extend((word, self.dates[col], int(count))
+                           for col, count in zip(self.indices[start:end], self.data[start:end]))
+
+        df = pd.DataFrame(records, columns=["word", "date", "count"])
+        df["date"] = pd.to_datetime(df["date"])
+        return df.sort_values("date")
+
+    def export_csv(self, path, top_k=None, min_total=None):
+        """Streams the word x date matrix (plus a `total` column) to CSV, one dense row at a time."""
+        rows = self.select_rows(top_k, min_total)
+        dense_row = np.zeros(len(self.dates), dtype=np.int64)
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["word", *self.dates, "total"])
+            for row in rows:
+                start, end = self.indptr[row], self.indptr[row + 1]
+                dense_row[:] = 0
+                dense_row[self.indices[start:end]] = self.data[start:end]
+                writer.writerow([self.vocabulary[row], *dense_row.tolist(), int(self.totals[row])])
+
+        return len(rows)
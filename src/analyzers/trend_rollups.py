@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+GRANULARITIES = ("day", "week", "month")
+ROLLUPS_VERSION = 1
+META_FILE = "meta.json"
+
+
+def to_days(dates):
+    # YYYY-MM-DD strings -> days since 1970-01-01
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def bucket_days(days, granularity):
+    """Start of the bucket of every day number: the day itself, the Monday of its ISO week or the 1st of its month."""
+    days = np.asarray(days, dtype=np.int64)
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return days - (days + 3) % 7  # 1970-01-01 was a Thursday
+    if granularity == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"Unknown granularity {granularity!r}, expected one of {', '.join(GRANULARITIES)}")
+
+
+def bucket_range(first, last, granularity):
+    # every bucket start from `first` to `last` (both bucket starts), empty buckets included
+    if granularity == "day":
+        return np.arange(first, last + 1, dtype=np.int64)
+    if granularity == "week":
+        return np.arange(first, last + 1, 7, dtype=np.int64)
+    months = np.arange(np.datetime64(int(first), "D").astype("datetime64[M]"),
+                       np.datetime64(int(last), "D").astype("datetime64[M]") + 1)
+    return months.astype("datetime64[D]").astype(np.int64)
+
+
+def shift_buckets(day, n, granularity):
+    # start of the bucket `n` buckets after (before, if negative) the one starting on `day`
+    if granularity == "day":
+        return day + n
+    if granularity == "week":
+        return day + 7 * n
+    return (np.datetime64(int(day), "D").astype("datetime64[M]") + n).astype("datetime64[D]").astype(np.int64)
+
+
+def bucket_label(day, granularity):
+    date = np.datetime64(int(day), "D").item()
+    if granularity == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return date.strftime("%Y-%m")
+    return date.isoformat()
+
+
+def build_rollups(path, rows, fingerprint="", by_channel=True):
+    """Writes day / ISO-week / month rollups of (word, date, channel_id, count) rows to the `path` directory.
+
+    Every granularity is a columnar cube of int arrays (bucket start, word id, count),
+    sorted by bucket and then word; with `by_channel` a second cube keeps one row per
+    (bucket, channel, word). Arrays are stored as `.npy` files, so `TrendRollups` maps
+    them instead of reading them. Returns the number of (day, word) cells.
+    """
+    word_ids, channel_ids, date_ids = {}, {}, {}
+    word_codes, channel_codes, date_codes, counts = array("q"), array("q"), array("q"), array("q")
+    for word, date, channel_id, count in rows:
+        word_codes.append(word_ids.setdefault(word, len(word_ids)))
+        channel_codes.append(channel_ids.setdefault(channel_id or "", len(channel_ids)))
+        date_codes.append(date_ids.setdefault(date, len(date_ids)))
+        counts.append(count)
+
+    words = np.frombuffer(word_codes, dtype=np.int64)
+    channels = np.frombuffer(channel_codes, dtype=np.int64)
+    counts = np.frombuffer(counts, dtype=np.int64)
+    days = to_days(list(date_ids))[np.frombuffer(date_codes, dtype=np.int64)]
+    n_words, n_channels = max(len(word_ids), 1), max(len(channel_ids), 1)
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    def save_cube(prefix, keys, columns):
+        # sums the counts of equal keys; keys are ordered like the wanted row order
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        np.save(os.path.join(tmp_path, f"{prefix}_count.npy"),
+                np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64))
+        for name, (values, dtype) in columns(unique_keys).items():
+            np.save(os.path.join(tmp_path, f"{prefix}_{name}.npy"), values.astype(dtype))
+        return len(unique_keys)
+
+    cells = {}
+    for granularity in GRANULARITIES:
+        buckets = bucket_days(days, granularity)
+        first = int(buckets.min()) if len(buckets) else 0
+        offsets = buckets - first
+
+        cells[granularity] = save_cube(granularity, offsets * n_words + words, lambda keys: {
+            "bucket": (keys // n_words + first, np.int32),
+            "word": (keys % n_words, np.int32),
+        })
+        if by_channel:
+            save_cube(f"{granularity}_channel", (offsets * n_channels + channels) * n_words + words, lambda keys: {
+                "bucket": (keys // (n_channels * n_words) + first, np.int32),
+                "channel": (keys // n_words % n_channels, np.int32),
+                "word": (keys % n_words, np.int32),
+            })
+
+    meta = {"version": ROLLUPS_VERSION, "fingerprint": fingerprint, "by_channel": by_channel,
+            "cells": cells, "words": list(word_ids), "channels": list(channel_ids)}
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logging.info(f"📊 Trend rollups: {len(word_ids)} words, {len(channel_ids)} channels, "
+                 + ", ".join(f"{count} {granularity} cells" for granularity, count in cells.items()))
+    return cells["day"]
+
+
+class TrendRollups:
+    """Read-only queries over the rollups written by `build_rollups`.
+
+    Cubes are memory-mapped and sorted by bucket, so a date range is two binary
+    searches and a query only touches the cells in that range. Dates are
+    YYYY-MM-DD strings (inclusive, None = open), `channel` is a channel_id
+    (None = all channels), results use bucket labels: 2024-03-05, 2024-W10, 2024-03.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.fingerprint = meta["fingerprint"]
+        self.by_channel = meta["by_channel"]
+        self.words = meta["words"]
+        self.channels = meta["channels"]
+        self.word_ids = {word: idx for idx, word in enumerate(self.words)}
+        self.channel_ids = {channel: idx for idx, channel in enumerate(self.channels)}
+        self._cubes = {}
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, META_FILE))
+
+    def cube(self, granularity, channel=None):
+        prefix = granularity if channel is None else f"{granularity}_channel"
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity {granularity!r}, expected one of {', '.join(GRANULARITIES)}")
+        if channel is not None and not self.by_channel:
+            raise ValueError(f"Rollups in {self.path} were built without per-channel cubes")
+
+        if prefix not in self._cubes:
+            names = ("bucket", "word", "count") + (("channel",) if channel is not None else ())
+            self._cubes[prefix] = {name: np.load(os.path.join(self.path, f"{prefix}_{name}.npy"), mmap_mode="r")
+                                   for name in names}
+        return self._cubes[prefix]
+
+    def select_buckets(self, granularity, first=None, last=None, channel=None):
+        # (buckets, word ids, counts) of whole buckets, `first` and `last` are bucket starts (day numbers, inclusive)
+        cube = self.cube(granularity, channel)
+        buckets = cube["bucket"]
+        lo = 0 if first is None else np.searchsorted(buckets, first, "left")
+        hi = len(buckets) if last is None else np.searchsorted(buckets, last, "right")
+        selected = (buckets[lo:hi], cube["word"][lo:hi], cube["count"][lo:hi])
+        if channel is None:
+            return selected
+
+        mask = cube["channel"][lo:hi] == self.channel_ids.get(channel, -1)
+        return tuple(column[mask] for column in selected)
+
+    def partial_bucket(self, granularity, first_day, last_day, channel=None):
+        # the days from `first_day` to `last_day` of one bucket, summed per word from the day cube
+        _, words, counts = self.select_buckets("day", first_day, last_day, channel)
+        words, inverse = np.unique(words, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(words)).astype(np.int64)
+        return np.full(len(words), bucket_days(first_day, granularity), dtype=np.int64), words, counts
+
+    def select(self, granularity="day", start=None, end=None, channel=None):
+        """(buckets, word ids, counts) of the cells from `start` to `end`; for one channel, if given.
+
+        The range is exact to the day: a week or month only partly inside it counts
+        just the days inside, read from the day cube.
+        """
+        first_day = None if start is None else int(to_days([start])[0])
+        last_day = None if end is None else int(to_days([end])[0])
+        first = None if first_day is None else int(bucket_days(first_day, granularity))
+        last = None if last_day is None else int(bucket_days(last_day, granularity))
+        head = first_day is not None and first_day != first
+        tail = last_day is not None and last_day != shift_buckets(last, 1, granularity) - 1
+        if not head and not tail:
+            return self.select_buckets(granularity, first, last, channel)
+        if first == last:
+            return self.partial_bucket(granularity, first_day, last_day, channel)
+
+        parts = []
+        if head:
+            parts.append(self.partial_bucket(granularity, first_day, shift_buckets(first, 1, granularity) - 1, channel))
+            first = shift_buckets(first, 1, granularity)
+        middle_last = shift_buckets(last, -1, granularity) if tail else last
+        if first is None or middle_last is None or first <= middle_last:
+            parts.append(self.select_buckets(granularity, first, middle_last, channel))
+        if tail:
+            parts.append(self.partial_bucket(granularity, last, last_day, channel))
+        return tuple(np.concatenate([part[column] for part in parts]).astype(np.int64) for column in range(3))
+
+    def totals(self, start=None, end=None, channel=None):
+        # count of every word id in the date range
+        _, words, counts = self.select("day", start, end, channel)
+        return np.bincount(words, weights=counts, minlength=len(self.words)).astype(np.int64)
+
+    def range_sum(self, words=None, start=None, end=None, channel=None):
+        """{word: count} from `start` to `end`, for `words` or every word that occurs."""
+        totals = self.totals(start, end, channel)
+        if words is None:
+            return {self.words[idx]: int(totals[idx]) for idx in np.flatnonzero(totals)}
+        return {word: int(totals[self.word_ids[word]]) if word in self.word_ids else 0 for word in words}
+
+    def series(self, word, granularity="day", start=None, end=None, channel=None):
+        """[(bucket label, count)] of one word, empty buckets included."""
+        buckets, words, counts = self.select(granularity, start, end, channel)
+        first = bucket_days(to_days([start]), granularity)[0] if start else (buckets[0] if len(buckets) else None)
+        last = bucket_days(to_days([end]), granularity)[0] if end else (buckets[-1] if len(buckets) else None)
+        if first is None or last is None:
+            return []
+
+        axis = bucket_range(first, last, granularity)
+        values = np.zeros(len(axis), dtype=np.int64)
+        mask = words == self.word_ids.get(word, -1)
+        np.add.at(values, np.searchsorted(axis, buckets[mask]), counts[mask])
+        return [(bucket_label(day, granularity), int(value)) for day, value in zip(axis, values)]
+
+    def rolling(self, word, window, granularity="day", start=None, end=None, channel=None):
+        """[(bucket label, sum over this and the `window` - 1 previous buckets)] of one word.
+
+        Windows are made of whole buckets: the first ones also count the buckets before
+        `start`, and the bucket holding `start` counts in full.
+        """
+        if window < 1:
+            raise ValueError(f"Rolling window must be at least 1 bucket, got {window}")
+        lead = 0
+        if start is not None:
+            lead = window - 1
+            first = shift_buckets(bucket_days(to_days([start]), granularity)[0], -lead, granularity)
+            start = str(np.datetime64(int(first), "D"))
+        series = self.series(word, granularity, start, end, channel)
+        rolled = np.cumsum([value for _, value in series], dtype=np.int64)
+        rolled[window:] -= rolled[:-window].copy()
+        return [(label, int(value)) for (label, _), value in zip(series[lead:], rolled[lead:])]
+
+    def top_k(self, k, granularity="day", start=None, end=None, channel=None):
+        """[(bucket label, [(word, count)] of the K most frequent words)] for every non-empty bucket."""
+        buckets, words, counts = self.select(granularity, start, end, channel)
+        result = []
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1, [len(buckets)]]) if len(buckets) else []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            bucket_counts = counts[lo:hi]
+            top = np.argsort(-bucket_counts, kind="stable")[:k]
+            result.append((bucket_label(buckets[lo], granularity),
+                           [(self.words[words[lo + idx]], int(bucket_counts[idx])) for idx in top]))
+        return result
+
+    def rising(self, k, start, end, baseline_start, baseline_end, channel=None, min_count=5):
+        """[(word, count, baseline count, ratio)] of the K words whose daily rate grew most against the baseline.
+
+        E.g. this week against last month; the rates are add-one smoothed, so words new
+        in the period rank by their count, and words below `min_count` are skipped.
+        """
+        days = int(to_days([end])[0] - to_days([start])[0]) + 1
+        baseline_days = int(to_days([baseline_end])[0] - to_days([baseline_start])[0]) + 1
+        current = self.totals(start, end, channel)
+        baseline = self.totals(baseline_start, baseline_end, channel)
+
+        ratio = ((current + 1) / days) / ((baseline + 1) / baseline_days)
+        candidates = np.flatnonzero(current >= min_count)
+        top = candidates[np.argsort(-ratio[candidates], kind="stable")[:k]]
+        return [(self.words[idx], int(current[idx]), int(baseline[idx]), float(ratio[idx])) for idx in top]
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import os
+import sqlite3
+
+
+class TrendStore:
+    """Persistent (word, date) -> count store for WordTrendAnalyzer.
+
+    Every aggregated video is recorded with the content key of its transcript
+    and its own word counts, so a run applies only new videos as deltas and a
+    changed (or removed) video can be retracted exactly.
+    """
+
+    def __init__(self, store_path, fingerprint):
+        self.store_path = store_path
+        self.fingerprint = fingerprint
+        os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(store_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, content_key TEXT NOT NULL, date TEXT NOT NULL,"
+            " channel_id TEXT);"
+            "CREATE TABLE IF NOT EXISTS video_words (video_id TEXT NOT NULL, word TEXT NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (video_id, word)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS counts (word TEXT NOT NULL, date TEXT NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (word, date)) WITHOUT ROWID;"
+        )
+        if "channel_id" not in {row[1] for row in self._conn.execute("PRAGMA table_info(videos)")}:
+            self._conn.execute("ALTER TABLE videos ADD COLUMN channel_id TEXT")  # stores from before the rollups
+
+        # counts built with other NLP settings (stopwords, min length, ...) cannot be mixed
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if row is not None and row[0] != fingerprint:
+            logging.info(f"♻️ Trend store {store_path} was built with other settings, resetting it")
+            self._conn.executescript("DELETE FROM videos; DELETE FROM video_words; DELETE FROM counts;")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+        self._conn.commit()
+
+        logging.info(f"📌 Trend store opened: {store_path} ({len(self.video_ids())} videos)")
+
+    def content_key(self, text):
+        digest = hashlib.sha1(self.fingerprint.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def video_ids(self):
+        return {row[0] for row in self._conn.execute("SELECT video_id FROM videos")}
+
+    def get_content_key(self, video_id):
+        row = self._conn.execute("SELECT content_key FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return row[0] if row else None
+
+    def apply(self, video_id, content_key, date, word_counts, channel_id=None):
+        # Adds one video's counts, replacing its previous contribution if there was one
+        self.retract(video_id)
+        self._conn.execute("INSERT INTO videos (video_id, content_key, date, channel_id) VALUES (?, ?, ?, ?)",
+                           (video_id, content_key, date, channel_id))
+        rows = [(video_id, word, count) for word, count in word_counts.items()]
+        self._conn.executemany("INSERT INTO video_words (video_id, word, count) VALUES (?, ?, ?)", rows)
+        self._conn.executemany(
+            "INSERT INTO counts (word, date, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (word, date) DO UPDATE SET count = count + excluded.count",
+            [(word, date, count) for word, count in word_counts.items()],
+        )
+
+    def retract(self, video_id):
+        row = self._conn.execute("SELECT date FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None:
+            return False
+
+        date = row[0]
+        words = self._conn.execute("SELECT word, count FROM video_words WHERE video_id = ?", (video_id,)).fetchall()
+        self._conn.executemany("UPDATE counts SET count = count - ? WHERE word = ? AND date = ?",
+                               [(count, word, date) for word, count in words])
+        self._conn.execute("DELETE FROM counts WHERE date = ? AND count <= 0", (date,))
+        self._conn.execute("DELETE FROM video_words WHERE video_id = ?", (video_id,))
+        self._conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+        return True
+
+    def iter_counts(self):
+        yield from self._conn.execute("SELECT word, date, count FROM counts ORDER BY date, word")
+
+    def iter_channel_counts(self):
+        # (word, date, channel_id, count), summed from the per-video counts
+        yield from self._conn.execute(
+            "SELECT w.word, v.date, v.channel_id, SUM(w.count) FROM video_words w JOIN videos v USING (video_id)"
+            " GROUP BY v.date, v.channel_id, w.word")
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
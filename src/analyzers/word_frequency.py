@@ -1,12 +1,14 @@
+import hashlib
 import logging
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-from collections import Counter
-from wordcloud import WordCloud
-from concurrent.futures import ThreadPoolExecutor
-import time
-from src.analyzers.stanza_base_analyzer import StanzaBaseAnalyzer
+from src.analyzers.chart_renderer import ChartRenderer, WORDCLOUD_TOP_K
+from src.analyzers.lemma_counts import LemmaCounts
+from src.analyzers.stanza_base_analyzer import StanzaBaseAnalyzer, DEFAULT_DOCS_PER_BATCH
+from src.metrics import metrics
+
+PREVIEW_EVERY = 500  # transcripts between running top-N log lines
+PREVIEW_TOP_N = 10
 
 class WordFrequencyAnalyzer(StanzaBaseAnalyzer):
     def __init__(self,
@@ -16,9 +18,16 @@ class WordFrequencyAnalyzer(StanzaBaseAnalyzer):
                  min_length=3,
                  output_plots="/output/plots",
                  num_threads=4,  # ✅ Number of threads for parallel processing
-                 cache_nlp_results=True  # ✅ Cache NLP results
+                 cache_nlp_results=True,  # ✅ Cache NLP results
+                 executor="thread",  # ✅ 'thread' or 'process' (one Stanza pipeline per worker process)
+                 batch_sizes=None,  # ✅ Stanza processor batch sizes, e.g. {"pos_batch_size": 1000}
+                 docs_per_batch=DEFAULT_DOCS_PER_BATCH,  # ✅ Transcripts per bulk Stanza call
+                 backend="stanza",  # ✅ 'stanza' (full pipeline) or 'fast' (lemma table lookup)
+                 **nlp_options  # ✅ Other StanzaBaseAnalyzer options: model_dir, offline, use_gpu, corpus_dir
                  ):
-        super().__init__(analyze_list_csv, transcripts_dir)
+        super().__init__(analyze_list_csv, transcripts_dir, executor=executor, num_workers=num_threads,
+                         batch_sizes=batch_sizes, docs_per_batch=docs_per_batch, backend=backend,
+                         **nlp_options)
         self.output_csv = output_csv
         self.top_n = top_n
         self.min_length = min_length
@@ -26,6 +35,11 @@ class WordFrequencyAnalyzer(StanzaBaseAnalyzer):
         self.num_threads = num_threads  # ✅ Store the number of threads
         self.cache_nlp_results = cache_nlp_results
         self.nlp_cache_file = output_csv.replace(".csv", "_nlp.csv")  # ✅ Cached NLP data file
+        self.nlp_cache_key_file = self.nlp_cache_file + ".key"  # ✅ Analyze list + config it was built from
+        self.nlp_window = max(1, num_threads * docs_per_batch)  # ✅ Cache misses per parallel NLP round
+        self.word_counts = LemmaCounts()  # ✅ Running totals, readable while `analyze` runs
+        self.transcripts_counted = 0
+        self.renderer = ChartRenderer()  # ✅ Charts are drawn headless in a separate process
 
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
         if output_plots.startswith("/"):
@@ -36,25 +50,45 @@ class WordFrequencyAnalyzer(StanzaBaseAnalyzer):
         os.makedirs(self.output_plots, exist_ok=True)
 
     def analyze(self):
-        if self.cache_nlp_results and os.path.exists(self.nlp_cache_file):
+        nlp_cache_key = self.nlp_cache_key()
+        if self.cache_nlp_results and self.is_nlp_cache_fresh(nlp_cache_key):
             logging.info(f"✅ Loading cached NLP results from {self.nlp_cache_file}")
             df = pd.read_csv(self.nlp_cache_file)
         else:
-            transcripts = self.load_transcripts()
-            if not transcripts:
+            self.word_counts = word_counts = LemmaCounts()
+            self.transcripts_counted = 0
+            transcripts_seen = 0
+            window = []  # cache misses waiting for NLP, bounded by `nlp_window`
+            logging.info(f"🔄 Starting NLP with {self.num_threads} {self.executor} workers...")
+
+            with metrics.stage("frequency_nlp") as timer:
+                # ✅ Transcripts are streamed, only new or changed ones go through the NLP pipeline
+                for video_id, _, text in self.iter_transcripts():
+                    transcripts_seen += 1
+                    lemmas = self.get_cached_lemmas(video_id, text)
+                    if lemmas is not None:
+                        self.count_lemmas(lemmas)
+                        continue
+
+                    window.append((video_id, text))
+                    if len(window) >= self.nlp_window:
+                        self.process_window(window)
+                        window = []
+
+                if window:
+                    self.process_window(window)
+
+            if not transcripts_seen:
                 logging.error("Missing all transcripts!")
                 return
 
-            texts = [t[2] for t in transcripts]
-            logging.info(f"🔄 Starting NLP with {self.num_threads} threads...")
-            start_time = time.time()
-            all_words = self.parallel_clean_text(texts)  # ✅ Parallel processing
-            total_time = time.time() - start_time
-            logging.info(f"✅ Finished NLP processing in {total_time:.2f}s. Found {len(all_words)} words.")
+            logging.info(f"✅ Finished NLP processing in {timer.elapsed:.2f}s. Processed {transcripts_seen} transcripts.")
 
-            word_counts = Counter(all_words)
+            self.log_preview()
             df = pd.DataFrame(word_counts.items(), columns=["word", "count"])
             df.to_csv(self.nlp_cache_file, index=False, encoding="utf-8")
+            with open(self.nlp_cache_key_file, "w", encoding="utf-8") as f:
+                f.write(nlp_cache_key)
             logging.info(f"✅ Cached NLP results saved to {self.nlp_cache_file}")
 
         # ✅ Now filter for top_n words only for visualization
@@ -62,62 +96,83 @@ class WordFrequencyAnalyzer(StanzaBaseAnalyzer):
         df_sorted.to_csv(self.output_csv, index=False, encoding="utf-8")
         logging.info(f"✅ Word frequency analysis saved to {self.output_csv}")
 
-        word_counts = dict(zip(df_sorted["word"], df_sorted["count"]))
-        self.generate_wordcloud(word_counts)
-        self.plot_top_words(df_sorted.head(self.top_n).values.tolist())
+        with metrics.stage("wordcloud"):
+            self.generate_wordcloud(df_sorted.head(WORDCLOUD_TOP_K).values.tolist())
+        with metrics.stage("plot"):
+            self.plot_top_words(df_sorted.head(self.top_n).values.tolist())
+        with metrics.stage("render_charts"):
+            self.renderer.wait()
+
+    def close(self):
+        super().close()
+        self.renderer.close()
+
+    def nlp_cache_key(self):
+        # Corpus-wide cache is only valid for the same analyze list, NLP config and transcripts
+        digest = hashlib.sha1(self.nlp_fingerprint.encode("utf-8"))
+        if os.path.exists(self.analyze_list_csv):
+            with open(self.analyze_list_csv, "rb") as f:
+                digest.update(f.read())
+            # ✅ Fetched, re-fetched or deleted transcripts change their version (manifest / packed corpus lookups)
+            for video_id, channel_id, _ in self.load_analyze_list():
+                digest.update(f"{video_id}\t{self.transcript_version(video_id, channel_id)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_nlp_cache_fresh(self, nlp_cache_key):
+        if not os.path.exists(self.nlp_cache_file) or not os.path.exists(self.nlp_cache_key_file):
+            return False
+
+        with open(self.nlp_cache_key_file, "r", encoding="utf-8") as f:
+            if f.read().strip() == nlp_cache_key:
+                return True
+
+        logging.info(f"♻️ Cached NLP results in {self.nlp_cache_file} are stale, recomputing")
+        return False
+
+    def count_lemmas(self, lemmas):
+        self.word_counts.add(lemmas)
+        self.transcripts_counted += 1
+        if self.transcripts_counted % PREVIEW_EVERY == 0:
+            self.log_preview()
+
+    def log_preview(self):
+        top = ", ".join(f"{word} ({count})" for word, count in self.word_counts.most_common(PREVIEW_TOP_N))
+        logging.info(f"📊 {self.transcripts_counted} transcripts, {len(self.word_counts)} distinct words "
+                     f"| TOP {PREVIEW_TOP_N}: {top}")
+
+    def process_window(self, window):
+        """Lemmatizes a window of (video_id, text) in parallel and counts every text as soon as it is done.
+
+        Each lemma list is cached and merged into the int-coded running totals, then dropped,
+        so only the batches in flight are held as lemma lists.
+        """
+        for idx, lemmas in self.parallel_clean_text([text for _, text in window]):  # ✅ Parallel processing
+            video_id, text = window[idx]
+            self.store_lemmas(video_id, text, lemmas)
+            self.count_lemmas(lemmas)
 
     def parallel_clean_text(self, texts):
-        """Splits texts into chunks and processes them in parallel."""
-        chunk_size = max(1, len(texts) // self.num_threads)
-        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
-
-        total_chunks = len(chunks)
-        start_time = time.time()
-
-        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            results = []
-            for i, result in enumerate(executor.map(self.clean_text, chunks), 1):
-                results.append(result)
-                elapsed_time = time.time() - start_time
-                estimated_total_time = (elapsed_time / i) * total_chunks
-                remaining_time = estimated_total_time - elapsed_time
-                logging.info(f"🔄 Processed {i}/{total_chunks} chunks ({(i/total_chunks)*100:.2f}%) | Elapsed: {elapsed_time:.2f}s | ETA: {remaining_time:.2f}s")
+        """Processes texts in parallel, yields (index in `texts`, lemma list) in completion order."""
+        total_texts = len(texts)
 
-        # Flatten the results
-        return [word for sublist in results for word in sublist]
+        with metrics.stage("nlp") as timer:
+            for i, (idx, result) in enumerate(self.imap_clean_text(texts), 1):
+                elapsed_time = timer.elapsed
+                estimated_total_time = (elapsed_time / i) * total_texts
+                remaining_time = estimated_total_time - elapsed_time
+                logging.info(f"🔄 Processed {i}/{total_texts} transcripts ({(i/total_texts)*100:.2f}%) | Elapsed: {elapsed_time:.2f}s | ETA: {remaining_time:.2f}s")
+                yield idx, result
 
     def generate_wordcloud(self, word_counts):
-        wordcloud = WordCloud(width=800, height=400, background_color="white").generate_from_frequencies(word_counts)
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation="bilinear")
-        plt.axis("off")
-        plt.title("Word Map")
-
-        # save to file
+        # ✅ Only the TOP-K words can fit on the map, the renderer process draws it in the background
         wordcloud_path = os.path.join(self.output_plots, "wordcloud.png")
-        plt.savefig(wordcloud_path, bbox_inches="tight")
-
-        # also show
-        plt.show()
-
-        # then close
-        plt.close()
+        self.renderer.submit("wordcloud", wordcloud_path,
+                             frequencies=[[word, int(count)] for word, count in word_counts[:WORDCLOUD_TOP_K]],
+                             title="Word Map")
 
     def plot_top_words(self, most_common_words):
         words, counts = zip(*most_common_words)
-        plt.figure(figsize=(12, 6))
-        plt.bar(words, counts, color="blue")
-        plt.xticks(rotation=45, ha="right")
-        plt.xlabel("Word")
-        plt.ylabel("Number of occurrences")
-        plt.title(f"Most popular words (TOP {self.top_n})")
-
-        # save to file
         top_words_path = os.path.join(self.output_plots, "top_words.png")
-        plt.savefig(top_words_path, bbox_inches="tight")
-
-        # also show
-        plt.show()
-
-        # then close
-        plt.close()
+        self.renderer.submit("bars", top_words_path,
+                             words=list(words), counts=[int(count) for count in counts],
+                             title=f"Most popular words (TOP {self.top_n})")
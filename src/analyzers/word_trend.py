@@ -1,13 +1,14 @@
+import csv
 import os
-import time
 import logging
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.cm as cm
-from collections import defaultdict
-from src.analyzers.stanza_base_analyzer import StanzaBaseAnalyzer
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from src.analyzers.chart_renderer import ChartRenderer, resample_trends
+from src.analyzers.nlp_scheduler import ChunkScheduler, DEFAULT_BATCH_CHARS, DEFAULT_WINDOW_CHARS
+from src.analyzers.stanza_base_analyzer import StanzaBaseAnalyzer, DEFAULT_DOCS_PER_BATCH
+from src.analyzers.trend_matrix import SparseTrendMatrix
+from src.analyzers.trend_rollups import TrendRollups, build_rollups
+from src.analyzers.trend_store import TrendStore
+from src.metrics import metrics, StageTimer
 
 
 class WordTrendAnalyzer(StanzaBaseAnalyzer):
@@ -18,150 +19,194 @@ class WordTrendAnalyzer(StanzaBaseAnalyzer):
                  output_dir=None,
                  n_top_words=15,
                  max_workers=8,
-                 chunk_size=5000
+                 chunk_size=5000,
+                 executor="thread",  # 'thread' or 'process' (one Stanza pipeline per worker process)
+                 batch_sizes=None,  # Stanza processor batch sizes, e.g. {"pos_batch_size": 1000}
+                 docs_per_batch=DEFAULT_DOCS_PER_BATCH,  # chunks per bulk Stanza call
+                 backend="stanza",  # 'stanza' (full pipeline) or 'fast' (lemma table lookup)
+                 matrix_top_k=None,  # keep only K most frequent words in the matrix export
+                 matrix_min_total=None,  # skip words with fewer occurrences in the matrix export
+                 batch_chars=DEFAULT_BATCH_CHARS,  # chunks of many videos are packed into NLP tasks of this size
+                 window_chars=DEFAULT_WINDOW_CHARS,  # transcripts read ahead and scheduled together
+                 rollups_by_channel=True,  # day / week / month rollups also split by channel_id
+                 **nlp_options  # other StanzaBaseAnalyzer options: model_dir, offline, use_gpu, corpus_dir
                  ):
-        super().__init__(analyze_list_csv, transcripts_dir)
+        super().__init__(analyze_list_csv, transcripts_dir, executor=executor, num_workers=max_workers,
+                         batch_sizes=batch_sizes, docs_per_batch=docs_per_batch, backend=backend,
+                         **nlp_options)
         self.output_csv = output_csv
         self.min_length = min_length
         self.top_n = n_top_words  # dynamic for n of words on chart
         self.max_workers = max_workers  # n of threads
         self.chunk_size = chunk_size  # size of chunk for single thread
+        self.matrix_top_k = matrix_top_k
+        self.matrix_min_total = matrix_min_total
+        self.rollups_by_channel = rollups_by_channel
+        self.scheduler = ChunkScheduler(self, chunk_size, batch_chars, window_chars)
+        self.transcripts_seen = 0  # read, including the ones the scheduler is still working on
+        self.videos_done = 0  # lemmatized (or failed) and skipped ones, the base of the ETA
+        self.videos_applied = 0
+        self.renderer = ChartRenderer()
+
+        # persistent {(word, date): count} store, only new or changed videos are applied to it
+        self.trend_store = TrendStore(output_csv.replace(".csv", "_store.sqlite"),
+                                      f"{self.nlp_fingerprint}:{min_length}")
+        # pre-aggregated day / ISO-week / month cubes, queried with `src/query_trends.py`
+        self.rollups_path = output_csv.replace(".csv", "_rollups")
 
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
         self.output_dir = output_dir if output_dir else os.path.join(base_dir, "output")
         self.output_plots_dir = os.path.join(base_dir, "output", "plots")
         os.makedirs(self.output_plots_dir, exist_ok=True)
 
-    def process_chunk(self, chunk, date):
-        words = self.clean_text([chunk])
+    @property
+    def trends_path(self):
+        return os.path.join(self.output_plots_dir, "word_trends.png")
 
-        local_trends = defaultdict(int)
-        for word in words:
-            if len(word) >= self.min_length:  # skip too short words
-                local_trends[(word, date)] += 1  # store with date (for multithread)
+    @property
+    def matrix_path(self):
+        return os.path.join(self.output_dir, "word_trends_matrix.csv")
 
-        return local_trends
-
-    def process_single_file(self, video_id, published_at, text):
-        if not published_at:
-            return {}
-
-        date = published_at[:10] # take YYYY-MM-DD
-
-        # split file into chunks for parallel processing
-        chunks = self.split_text_into_chunks(text, self.chunk_size)
-
-        local_trends = defaultdict(int)
-
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_chunk = {executor.submit(self.process_chunk, chunk, date): chunk for chunk in chunks}
-
-            for future in as_completed(future_to_chunk):
-                try:
-                    chunk_result = future.result()
-                    for (word, date), count in chunk_result.items():
-                        local_trends[(word, date)] += count  # collecting results
-
-                except Exception as e:
-                    logging.error(f"🚨 Chunk processing error: {e}")
-
-        return local_trends
-
-    def analyze(self):
-        transcripts = self.load_transcripts()
-        if not transcripts:
-            logging.warning("⚠️ No transcripts for analysis!")
-            return
-
-        word_trends = defaultdict(lambda: defaultdict(int))  # {word: {date: n_occurs}}
-
-        total_files = len(transcripts)
-        start_time = time.time()
-
-        for idx, (video_id, published_at, text) in enumerate(transcripts):
-            logging.info(f"📄 Processing video: {video_id} ({idx + 1}/{total_files})")
+    def pending_videos(self, seen_ids):
+        """Yields ((video_id, channel_id, date, content_key), text) of the videos that need NLP.
 
+        Unchanged videos are skipped and lemma cache hits are applied right away,
+        so only real work reaches the scheduler.
+        """
+        for video_id, channel_id, published_at, text in self.iter_transcripts(with_channel=True):
+            self.transcripts_seen += 1
             if not published_at:
+                self.videos_done += 1
                 continue
             date = published_at[:10]  # take: YYYY-MM-DD
-            file_start_time = time.time()
-
-            local_trends = self.process_single_file(video_id, published_at, text)
-
-            for (word, date), count in local_trends.items():
-                word_trends[word][date] += count  # collecting
-
-            # logging time
-            elapsed_file_time = time.time() - file_start_time
-            elapsed_total_time = time.time() - start_time
-            remaining_time = (elapsed_total_time / (idx + 1)) * (total_files - (idx + 1))
+            seen_ids.add(video_id)
+
+            content_key = self.video_content_key(date, channel_id, text)
+            if self.trend_store.get_content_key(video_id) == content_key:
+                metrics.inc("videos_unchanged")
+                self.videos_done += 1
+                continue  # already aggregated and unchanged
+
+            lemmas = self.get_cached_lemmas(video_id, text)
+            if lemmas is not None:
+                self.apply_lemmas(video_id, content_key, date, lemmas, channel_id)
+                self.videos_done += 1
+                continue
+            yield (video_id, channel_id, date, content_key), text
 
-            logging.info(
-                f"📄 Processed {idx + 1}/{total_files} | Time: {elapsed_file_time:.2f}s | Eta: {remaining_time:.2f}s")
+    def video_content_key(self, date, channel_id, text):
+        # a video is applied again when its date, channel or transcript changes
+        return self.trend_store.content_key(f"{date}\n{channel_id}\n{text}")
 
-        trend_data = [{"word": word, "date": date, "count": count}
-                      for word, date_counts in word_trends.items()
-                      for date, count in date_counts.items()]
+    def apply_lemmas(self, video_id, content_key, date, lemmas, channel_id=None):
+        with metrics.stage("count"):
+            word_counts = Counter(word for word in lemmas if len(word) >= self.min_length)  # skip too short words
+        with metrics.stage("trend_store_apply"):
+            self.trend_store.apply(video_id, content_key, date, word_counts, channel_id)  # replaces old counts
+            self.videos_applied += 1
+            if self.videos_applied % 100 == 0:
+                self.trend_store.commit()
 
-        df = pd.DataFrame(trend_data)
-        df["date"] = pd.to_datetime(df["date"])  # convert to datetime!!
-        df.sort_values("date", inplace=True)  # increasing dates (timeline)
-        df.to_csv(self.output_csv, index=False, encoding="utf-8")
+    def analyze(self):
+        run_timer = StageTimer("trend_analysis")  # total and ETA, the parts are recorded as stages
+        self.transcripts_seen = 0
+        self.videos_done = 0
+        self.videos_applied = 0
+        seen_ids = set()
+
+        # one scheduler for the whole corpus, videos come back tagged as soon as all their chunks are done
+        with metrics.stage("process_videos"):
+            for (video_id, channel_id, date, content_key), text, lemmas, error in \
+                    self.scheduler.run(self.pending_videos(seen_ids)):
+                self.videos_done += 1
+                if error is not None:
+                    metrics.inc("videos_failed")
+                    logging.error(f"🚨 Processing error for {video_id}: {error}")
+                    continue
+                self.store_lemmas(video_id, text, lemmas)
+                self.apply_lemmas(video_id, content_key, date, lemmas, channel_id)
+
+                # logging time
+                total_files = self.total_files  # known once the analyze list is read
+                remaining_time = (run_timer.elapsed / self.videos_done) * (total_files - self.videos_done)
+                logging.info(f"📄 Processed {video_id} | Done {self.videos_done}/{total_files} "
+                             f"(read {self.transcripts_seen}) | Elapsed: {run_timer.elapsed:.2f}s "
+                             f"| Eta: {remaining_time:.2f}s")
+
+        # videos which left the analyze list (or lost their transcript) are retracted, even if none is left
+        applied = self.videos_applied
+        removed = self.trend_store.video_ids() - seen_ids
+        for video_id in removed:
+            self.trend_store.retract(video_id)
+        self.trend_store.commit()
+        metrics.inc("videos_applied", applied)
+        metrics.inc("videos_retracted", len(removed))
+        logging.info(f"📊 Trend store: {applied} videos applied, {len(removed)} retracted")
+
+        if not self.transcripts_seen and not removed:
+            logging.warning("⚠️ No transcripts for analysis!")
+            return
 
-        total_time = time.time() - start_time
-        logging.info(f"✅ Saved trend analysis to {self.output_csv} | Total time: {total_time:.2f}s")
+        # long (word, date, count) CSV, streamed from the store in date order
+        with metrics.stage("export_trends_csv"):
+            with open(self.output_csv, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                writer.writerow(["word", "date", "count"])
+                writer.writerows(self.trend_store.iter_counts())
+
+        with metrics.stage("build_rollups"):
+            self.update_rollups(changed=applied or removed)
+
+        with metrics.stage("build_matrix"):
+            matrix = SparseTrendMatrix.from_counts(self.trend_store.iter_counts())
+        if not len(matrix.vocabulary):
+            logging.warning("⚠️ No words found for trend analysis!")
+            self.remove_stale_outputs()
+            return
 
-        self.plot_word_trends(df)
+        logging.info(f"✅ Saved trend analysis to {self.output_csv} | Total time: {run_timer.elapsed:.2f}s")
+
+        with metrics.stage("plot"):
+            self.plot_word_trends(matrix.top_frame(self.top_n))  # only the top-N view goes dense
+        with metrics.stage("export_matrix"):
+            self.export_matrix_to_csv(matrix)  # while the chart is being rendered
+        with metrics.stage("render_charts"):
+            self.renderer.wait()
+
+    def update_rollups(self, changed):
+        # rebuilt from the store when a video was applied or retracted, or the rollups are missing or stale
+        fingerprint = f"{self.trend_store.fingerprint}:{'channel' if self.rollups_by_channel else 'total'}"
+        if not changed and TrendRollups.exists(self.rollups_path) \
+                and TrendRollups(self.rollups_path).fingerprint == fingerprint:
+            logging.info(f"⚡ Trend rollups unchanged: {self.rollups_path}")
+            return
+        build_rollups(self.rollups_path, self.trend_store.iter_channel_counts(), fingerprint,
+                      by_channel=self.rollups_by_channel)
+        logging.info(f"✅ Saved trend rollups to {self.rollups_path}")
+
+    def remove_stale_outputs(self):
+        # the chart and the matrix of a previous run would still show retracted videos
+        for path in (self.trends_path, f"{self.trends_path}.key", self.matrix_path):
+            if os.path.exists(path):
+                os.remove(path)
+                logging.info(f"🗑️ Removed stale {path}")
+
+    def close(self):
+        super().close()
+        self.renderer.close()
+        self.trend_store.close()
 
     def plot_word_trends(self, df):
-        top_words = df.groupby("word")["count"].sum().nlargest(self.top_n).index.tolist()
-        df_filtered = df[df["word"].isin(top_words)]
-
-        plt.figure(figsize=(12, 6))
-
-        color_map = cm.get_cmap('tab20', len(top_words))
-        colors = [color_map(i) for i in range(len(top_words))]
-
-        for idx, word in enumerate(top_words):
-            subset = df_filtered[df_filtered["word"] == word]
-            plt.plot(
-                pd.to_datetime(subset["date"]),
-                subset["count"],
-                marker="o",
-                label=word,
-                color=colors[idx]
-            )
-
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-        plt.gca().xaxis.set_major_locator(mdates.DayLocator())
-
-        plt.xlabel("Date")
-        plt.ylabel("Number of words")
-        plt.title(f"Word occurrence over time (TOP {self.top_n})")
-        plt.legend()
-        plt.xticks(rotation=45)
-
-        trends_path = os.path.join(self.output_plots_dir, "word_trends.png")
-        plt.savefig(trends_path, bbox_inches="tight")
-        logging.info(f"✅ Saved tred chart to {trends_path}")
-
-        plt.show()
-        plt.close()
-
-        self.export_matrix_to_csv(df)
-
-
-    def export_matrix_to_csv(self, df):
-        pivot = df.pivot_table(index="word", columns="date", values="count", aggfunc="sum", fill_value=0)
-
-        # columns format date -> YYYY-MM-DD
-        pivot.columns = pivot.columns.strftime("%Y-%m-%d")
-
-        # add 'total' column
-        pivot["total"] = pivot.sum(axis=1)
-
-        # export to csv
-        matrix_path = os.path.join(self.output_dir, "word_trends_matrix.csv")
-        pivot.to_csv(matrix_path, encoding="utf-8")
-        logging.info(f"✅ Saved trend matrix to {matrix_path}")
-
+        # long ranges are summed per week or month, the chart itself is drawn by the renderer process
+        bucket, wide = resample_trends(df, self.top_n)
+        self.renderer.submit("trends", self.trends_path,
+                             dates=wide.index.strftime("%Y-%m-%d").tolist(),
+                             words=wide.columns.tolist(),
+                             values=wide.to_numpy().tolist(),
+                             title=f"Word occurrence over time (TOP {self.top_n})",
+                             bucket=bucket)
+
+    def export_matrix_to_csv(self, matrix):
+        # streamed from the sparse matrix, optionally pruned to top-K / min-total words
+        n_rows = matrix.export_csv(self.matrix_path, top_k=self.matrix_top_k, min_total=self.matrix_min_total)
+        logging.info(f"✅ Saved trend matrix to {self.matrix_path} ({n_rows} words)")
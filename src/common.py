@@ -1,47 +1,143 @@
 import csv
+import json
 import logging
+import threading
+import urllib.request
 
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
 import os
 from dotenv import load_dotenv
 from common_logging import setup_logging
+from metrics import metrics
+from video_catalog import VideoCatalog, source_name
 
 setup_logging()
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DISCOVERY_DOC_PATH = os.path.join(BASE_DIR, "output", "youtube_v3_discovery.json")
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+_csv_lock = threading.Lock()
+_catalog = None
+# httplib2 connections are not thread-safe, so every thread gets its own client (built once)
+_thread_local = threading.local()
+
+def load_discovery_document():
+    """YouTube Data API discovery document, read once from the local copy (fetched and saved on first use)."""
+    global _discovery_doc
+    with _discovery_lock:
+        if _discovery_doc is not None:
+            return _discovery_doc
+
+        if os.path.exists(DISCOVERY_DOC_PATH):
+            with open(DISCOVERY_DOC_PATH, "r", encoding="utf-8") as file:
+                _discovery_doc = json.load(file)
+            return _discovery_doc
+
+        try:  # copy bundled with google-api-python-client >= 2.0
+            from googleapiclient.discovery_cache import get_static_doc
+            content = get_static_doc("youtube", "v3")
+        except ImportError:
+            content = None
+        if content is None:
+            logging.info(f"Downloading YouTube discovery document from {DISCOVERY_URL}")
+            with urllib.request.urlopen(DISCOVERY_URL, timeout=30) as response:
+                content = response.read().decode("utf-8")
+
+        os.makedirs(os.path.dirname(DISCOVERY_DOC_PATH), exist_ok=True)
+        with open(DISCOVERY_DOC_PATH, "w", encoding="utf-8") as file:
+            file.write(content)
+        _discovery_doc = json.loads(content)
+        return _discovery_doc
+
 def get_youtube_service():
     if not API_KEY:
         raise ValueError("YOUTUBE_API_KEY is not set. Check your .env file.")
 
-    return build("youtube", "v3", developerKey=API_KEY)
+    service = getattr(_thread_local, "youtube", None)
+    if service is None:
+        service = build_from_document(load_discovery_document(), developerKey=API_KEY)
+        _thread_local.youtube = service
+    return service
+
+def execute(request):
+    # every YouTube Data API call goes through here, so calls and latency are counted in one place
+    metrics.inc("youtube_api_calls")
+    with metrics.stage("youtube_api") as timer:
+        response = request.execute()
+    metrics.observe("youtube_api_seconds", timer.elapsed)
+    return response
+
+def fetch_playlist_snippets(youtube, playlist_id, watermark=None):
+    """Snippets of playlist items published at or after `watermark` (all items if None), and the API pages used.
+
+    Paging stops after a page that is ordered newest-first and already reaches items older than the watermark
+    (uploads playlists always are). Pages in any other order are read to the end, so manually ordered
+    playlists are still complete.
+    """
+    snippets = []
+    pages = 0
+    request = youtube.playlistItems().list(
+        part="snippet",
+        playlistId=playlist_id,
+        maxResults=50
+    )
+    while request:
+        response = execute(request)
+        pages += 1
+        page = [item["snippet"] for item in response.get("items", [])]
+        snippets.extend(snippet for snippet in page if not watermark or snippet["publishedAt"] >= watermark)
+
+        dates = [snippet["publishedAt"] for snippet in page]
+        newest_first = all(newer >= older for newer, older in zip(dates, dates[1:]))
+        if watermark and newest_first and dates and dates[-1] < watermark:
+            break
+        request = youtube.playlistItems().list_next(request, response)
+
+    return snippets, pages
+
+def get_video_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = VideoCatalog()
+    return _catalog
 
 def save_to_csv(file_name, data, headers=None, skip_duplicates=True):
-    file_exists = os.path.isfile(file_name)
+    """Upserts `data` into the video catalog and appends the videos new to `file_name` to that CSV export.
 
-    existing_ids = set()
-    if skip_duplicates and file_exists:
-        with open(file_name, mode="r", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                existing_ids.add(row["video_id"])
+    Duplicates are detected by the catalog's index, the CSV is never re-read (except once, to import a
+    file that predates the catalog).
+    """
+    with _csv_lock:  # sources are fetched concurrently and may share an output file
+        catalog = get_video_catalog()
+        source = source_name(file_name)
+        file_exists = os.path.isfile(file_name)
+        if file_exists and not catalog.has_source(source):
+            catalog.import_csv(file_name, source)
 
-    new_data = [row for row in data if row["video_id"] not in existing_ids]
+        new_rows = catalog.upsert(data, source)
+        metrics.inc("videos_listed", len(data))
+        metrics.inc("videos_new", len(new_rows))
+        new_data = new_rows if skip_duplicates else data
 
-    if not new_data:
-        logging.info(f"No new video. Skipping save to {file_name}.")
-        return
+        if not new_data:
+            logging.info(f"No new video. Skipping save to {file_name}.")
+            return
 
-    with open(file_name, mode="a" if file_exists else "w", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=headers)
+        with open(file_name, mode="a" if file_exists else "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=headers)
 
-        if not file_exists:
-            writer.writeheader()
+            if not file_exists:
+                writer.writeheader()
 
-        writer.writerows(new_data)
+            writer.writerows(new_data)
 
-    logging.info(f"Saved {len(new_data)} new records to {file_name}")
+        logging.info(f"Saved {len(new_data)} new records to {file_name}")
 
 
 def get_channel_id_by_name(channel_name):
@@ -52,7 +148,7 @@ def get_channel_id_by_name(channel_name):
         type="channel",
         maxResults=1
     )
-    response = request.execute()
+    response = execute(request)
 
     if 'items' in response and len(response['items']) > 0:
         return response['items'][0]['snippet']['channelId']
@@ -1,108 +1,245 @@
+import heapq
 import json
 import logging
 import os
+import sqlite3
 import time
 import threading
 import atexit  # for saving cache after script execution
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from common_logging import setup_logging
 
 setup_logging(script_name="common_cache")
 
+CACHE_DB = os.path.join(os.path.dirname(__file__), "../output/cache.sqlite")
+# JSON caches used before the SQLite backend, imported once
 CACHE_FILE = os.path.join(os.path.dirname(__file__), "../output/cache.json")
-
 FAILED_CACHE_FILE = os.path.join(os.path.dirname(__file__), "../output/failed_transcripts.json")
+
 MAX_ATTEMPTS = 6
 WAIT_TIME = [0, 60, 3600, 86400, 86400, 86400] # minimal seconds wait time between attempts (86400 = 24h)
+SAVE_INTERVAL = 10 # in seconds, failed cache flush period of the background saver
+
+_conn = None
+_db_lock = threading.Lock()  # one connection shared by the fetch threads
 
 # Global caching, only for failed download cache
+# video_id -> {"attempts", "last_attempt" (readable), "next_attempt" (epoch seconds, None once given up)}
 _failed_cache = {}
 _failed_cache_lock = threading.Lock()
+_dirty = set()  # video_ids changed (or removed) since the last flush
+_save_lock = threading.Lock()  # flushes run one at a time, so an older snapshot never overwrites a newer one
+# Retry schedule: heap of (next_attempt, video_id), outdated entries are skipped when popped
+_retry_heap = []
+_saver_thread = None
+
+###############
+### STORAGE ###
+###############
+def _connect():
+    # SQLite: every write is a transaction, an interrupted run never leaves a truncated cache behind
+    global _conn
+    with _db_lock:
+        if _conn is not None:
+            return _conn
+
+        os.makedirs(os.path.dirname(CACHE_DB), exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS sources (source_type TEXT NOT NULL, source_id TEXT NOT NULL,"
+            " last_fetched TEXT, last_full_sync TEXT, PRIMARY KEY (source_type, source_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS failed (video_id TEXT PRIMARY KEY, attempts INTEGER NOT NULL,"
+            " last_attempt TEXT NOT NULL, next_attempt REAL) WITHOUT ROWID;"
+        )
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone() is None:
+            _import_json(conn)
+        _conn = conn
+        return _conn
+
+def _import_json(conn):
+    sources, failed = [], []
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+        full_sync = cache.get("full_sync", {})
+        for source_type in ("channels", "playlists"):
+            source_ids = set(cache.get(source_type, {})) | set(full_sync.get(source_type, {}))
+            sources.extend((source_type, source_id, cache.get(source_type, {}).get(source_id),
+                            full_sync.get(source_type, {}).get(source_id)) for source_id in source_ids)
+
+    if os.path.exists(FAILED_CACHE_FILE):
+        with open(FAILED_CACHE_FILE, "r", encoding="utf-8") as file:
+            try:
+                entries = json.load(file)
+            except json.JSONDecodeError:
+                entries = {}
+        for video_id, entry in entries.items():
+            next_attempt = entry.get("next_attempt")
+            if "next_attempt" not in entry:  # saved before the retry schedule, parsed once here
+                last_attempt = datetime.strptime(entry["last_attempt"], "%Y-%m-%d %H:%M:%S").timestamp()
+                next_attempt = _next_attempt(entry["attempts"], last_attempt)
+            failed.append((video_id, entry["attempts"], entry["last_attempt"], next_attempt))
+
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", sources)
+        conn.executemany("INSERT OR REPLACE INTO failed VALUES (?, ?, ?, ?)", failed)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (datetime.now().isoformat(),))
+    if sources or failed:
+        logging.info(f"📥 Imported {len(sources)} sources and {len(failed)} failed downloads from the JSON caches")
 
 ######################
 ### DOWNLOAD CACHE ###
 ######################
-def load_cache():
-    if not os.path.exists(CACHE_FILE):
-        return {"channels": {}, "playlists": {}}
+def _get_source(source_type, source_id, column):
+    conn = _connect()
+    with _db_lock:
+        row = conn.execute(f"SELECT {column} FROM sources WHERE source_type = ? AND source_id = ?",
+                           (source_type, source_id)).fetchone()
+    return row[0] if row else None
 
-    with open(CACHE_FILE, "r", encoding="utf-8") as file:
-        return json.load(file)
 
-
-def save_cache(cache):
-    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-    with open(CACHE_FILE, "w", encoding="utf-8") as file:
-        json.dump(cache, file, indent=4)
+def _set_source(source_type, source_id, column, value):
+    conn = _connect()
+    with _db_lock, conn:
+        conn.execute(f"INSERT INTO sources (source_type, source_id, {column}) VALUES (?, ?, ?)"
+                     f" ON CONFLICT (source_type, source_id) DO UPDATE SET {column} = excluded.{column}",
+                     (source_type, source_id, value))
 
 
 def get_last_fetched_date(source_type, source_id):
-    cache = load_cache()
-    return cache[source_type].get(source_id, None)
+    return _get_source(source_type, source_id, "last_fetched")
 
 
 def update_last_fetched_date(source_type, source_id, last_date):
-    cache = load_cache()
-    cache[source_type][source_id] = last_date
-    save_cache(cache)
+    _set_source(source_type, source_id, "last_fetched", last_date)
+
+
+def needs_full_resync(source_type, source_id, full_resync_days):
+    # a full resync pages through the whole source again to catch videos published "in the past" (backfills)
+    if not full_resync_days:
+        return False
+    last_full_sync = _get_source(source_type, source_id, "last_full_sync")
+    if last_full_sync is None:
+        return True
+    return datetime.now() - datetime.strptime(last_full_sync, "%Y-%m-%d %H:%M:%S") >= timedelta(days=full_resync_days)
+
+
+def update_last_full_sync(source_type, source_id):
+    _set_source(source_type, source_id, "last_full_sync", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
 ####################
 ### FAILED CACHE ###
 ####################
+def _next_attempt(attempts, last_attempt):
+    if attempts >= MAX_ATTEMPTS:
+        return None
+    return last_attempt + WAIT_TIME[min(attempts, len(WAIT_TIME) - 1)]
+
 def load_failed_cache():
-    global _failed_cache
-    if not os.path.exists(FAILED_CACHE_FILE):
-        _failed_cache = {}
-    else:
-        with open(FAILED_CACHE_FILE, "r", encoding="utf-8") as file:
-            try:
-                _failed_cache = json.load(file)
-            except json.JSONDecodeError:
-                _failed_cache = {}
+    global _failed_cache, _retry_heap
+    conn = _connect()
+    with _db_lock:
+        rows = conn.execute("SELECT video_id, attempts, last_attempt, next_attempt FROM failed").fetchall()
 
-def save_failed_cache():
     with _failed_cache_lock:
-        with open(FAILED_CACHE_FILE, "w", encoding="utf-8") as file:
-            json.dump(_failed_cache, file, indent=4)
-            logging.info("Transcripts downloads cache updated")
+        _failed_cache = {video_id: {"attempts": attempts, "last_attempt": last_attempt, "next_attempt": next_attempt}
+                         for video_id, attempts, last_attempt, next_attempt in rows}
+        _dirty.clear()
+        _retry_heap = [(entry["next_attempt"], video_id) for video_id, entry in _failed_cache.items()
+                       if entry["next_attempt"] is not None]
+        heapq.heapify(_retry_heap)
 
-def save_failed_cache_periodically():
+def save_failed_cache():
+    # flushes only the entries changed since the last call, in one transaction
+    with _save_lock:
+        with _failed_cache_lock:
+            if not _dirty:
+                return
+            changed = [(video_id, dict(_failed_cache[video_id]) if video_id in _failed_cache else None)
+                       for video_id in _dirty]
+            _dirty.clear()
+
+        conn = _connect()
+        with _db_lock, conn:
+            conn.executemany("INSERT OR REPLACE INTO failed (video_id, attempts, last_attempt, next_attempt) VALUES (?, ?, ?, ?)",
+                             [(video_id, entry["attempts"], entry["last_attempt"], entry["next_attempt"])
+                              for video_id, entry in changed if entry is not None])
+            conn.executemany("DELETE FROM failed WHERE video_id = ?",
+                             [(video_id,) for video_id, entry in changed if entry is None])
+    logging.info(f"Transcripts downloads cache updated ({len(changed)} changed)")
+
+def save_failed_cache_periodically(interval=SAVE_INTERVAL):
     while True:
-        time.sleep(10) # in seconds
+        time.sleep(interval)
         save_failed_cache()
 
-# save cache periodically while script is running
-cache_saver_thread = threading.Thread(target=save_failed_cache_periodically, daemon=True)
-cache_saver_thread.start()
-
-# save cache when script ends
-atexit.register(save_failed_cache)
-
-def should_retry(video_id):
+def start_failed_cache_saver(interval=SAVE_INTERVAL):
+    """Started by the transcript fetcher: flushes the failed cache periodically and when the script ends."""
+    global _saver_thread
+    if _saver_thread is not None:
+        return
+    _saver_thread = threading.Thread(target=save_failed_cache_periodically, args=(interval,), daemon=True)
+    _saver_thread.start()
+    atexit.register(save_failed_cache)
+
+def is_scheduled(video_id):
+    # failed before: either waiting for its next attempt or given up
     with _failed_cache_lock:
-        if video_id not in _failed_cache:
-            return True
+        return video_id in _failed_cache
 
-        attempts = _failed_cache[video_id]["attempts"]
-        last_attempt_str = _failed_cache[video_id]["last_attempt"]
-        last_attempt = datetime.strptime(last_attempt_str, "%Y-%m-%d %H:%M:%S")
+def pop_due_retries(now=None):
+    """{video_id: next_attempt} of every failed video whose next attempt is due, only due entries are touched.
 
-        if attempts >= MAX_ATTEMPTS:
-            return False
+    Popped videos leave the retry heap: hand them to `requeue_retries` once the pass is over.
+    """
+    now = time.time() if now is None else now
+    due = {}
+    with _failed_cache_lock:
+        while _retry_heap and _retry_heap[0][0] <= now:
+            next_attempt, video_id = heapq.heappop(_retry_heap)
+            entry = _failed_cache.get(video_id)
+            if entry is not None and entry["next_attempt"] == next_attempt:
+                due[video_id] = next_attempt
+    return due
+
+def requeue_retries(due):
+    """Puts popped videos without a new attempt recorded (throttled, not saved, not fetched) back on the heap."""
+    with _failed_cache_lock:
+        for video_id, next_attempt in due.items():
+            entry = _failed_cache.get(video_id)
+            if entry is not None and entry["next_attempt"] == next_attempt:
+                heapq.heappush(_retry_heap, (next_attempt, video_id))
 
-        wait_time = WAIT_TIME[min(attempts, len(WAIT_TIME) - 1)]
-        return (datetime.now() - last_attempt).total_seconds() >= wait_time
+def next_retries(window=86400):
+    """(time of the next eligible retry or None, retries becoming eligible within `window` seconds of it)."""
+    with _failed_cache_lock:
+        valid = [next_attempt for next_attempt, video_id in _retry_heap
+                 if video_id in _failed_cache and _failed_cache[video_id]["next_attempt"] == next_attempt]
+    if not valid:
+        return None, 0
+    first = min(valid)
+    return first, sum(1 for next_attempt in valid if next_attempt <= first + window)
+
+def given_up_count():
+    with _failed_cache_lock:
+        return sum(1 for entry in _failed_cache.values() if entry["next_attempt"] is None)
 
 def record_failed_attempt(video_id):
+    now = time.time()
     with _failed_cache_lock:
-        if video_id not in _failed_cache:
-            _failed_cache[video_id] = {"attempts": 1, "last_attempt": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        else:
-            _failed_cache[video_id]["attempts"] += 1
-            _failed_cache[video_id]["last_attempt"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry = _failed_cache.setdefault(video_id, {"attempts": 0})
+        entry["attempts"] += 1
+        entry["last_attempt"] = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        entry["next_attempt"] = _next_attempt(entry["attempts"], now)
+        if entry["next_attempt"] is not None:
+            heapq.heappush(_retry_heap, (entry["next_attempt"], video_id))
+        _dirty.add(video_id)
 
 def record_successful_attempt(video_id):
     with _failed_cache_lock:
         if video_id in _failed_cache:
-            del _failed_cache[video_id]
+            del _failed_cache[video_id]  # its heap entry is dropped lazily
+            _dirty.add(video_id)
@@ -0,0 +1,242 @@
+import argparse
+import bisect
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_TRANSCRIPTS_DIR = os.path.join(BASE_DIR, "output", "transcripts")
+
+MANIFEST_FILE = ".manifest.sqlite"  # inside the transcripts directory, next to the channel directories
+EXTENSIONS = (".seg", ".txt")  # in lookup order, `.txt` are transcripts saved before the structured format
+MAX_WORKERS = 8
+SIZE_BINS_KB = (1, 10, 20, 50, 100)  # same buckets as the old count_transcripts_by_size.sh
+
+Entry = namedtuple("Entry", "channel extension size mtime_ns sha1")
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_transcript_file(path, data):
+    """Writes a transcript file through a temp file in the same directory and `os.replace`.
+
+    The rename updates the directory mtime even when the file already existed, so
+    `CorpusManifest.refresh` sees rewritten transcripts, and readers never see a half-written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CorpusManifest:
+    """Inventory of the one-file-per-video transcript tree: video_id -> (channel, extension, size, mtime, sha1).
+
+    The whole manifest is held in memory, so existence checks and versions cost no
+    syscalls. `refresh` only rescans channel directories whose mtime changed (a file
+    was added, removed or renamed), in parallel with `os.scandir`, and only re-hashes
+    files whose size or mtime changed. Transcripts must be written with
+    `write_transcript_file`: a file rewritten in place does not touch its directory
+    and is only seen by `refresh(full=True)`.
+    """
+
+    def __init__(self, transcripts_dir=DEFAULT_TRANSCRIPTS_DIR, manifest_path=None):
+        self.transcripts_dir = transcripts_dir
+        self.manifest_path = manifest_path or os.path.join(transcripts_dir, MANIFEST_FILE)
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.manifest_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (video_id TEXT PRIMARY KEY, channel TEXT NOT NULL,"
+                           " extension TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                           " sha1 TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS channels (channel TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+        self.entries = {video_id: Entry(*row) for video_id, *row in self._conn.execute(
+            "SELECT video_id, channel, extension, size, mtime_ns, sha1 FROM files")}
+        self.channel_mtimes = dict(self._conn.execute("SELECT channel, mtime_ns FROM channels"))
+        self._recorded = {}  # video_id -> Entry, written by `flush`
+
+    def __contains__(self, video_id):
+        return video_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, video_id):
+        return self.entries.get(video_id)
+
+    def path(self, video_id):
+        entry = self.entries.get(video_id)
+        return None if entry is None else os.path.join(self.transcripts_dir, entry.channel,
+                                                       f"{video_id}{entry.extension}")
+
+    def version(self, video_id):
+        # same format as the per-file `os.stat` version of `BaseAnalyzer.transcript_version`
+        entry = self.entries.get(video_id)
+        return None if entry is None else f"{entry.extension}:{entry.size}:{entry.mtime_ns}"
+
+    def scan_channel(self, channel):
+        """{video_id: Entry} of one channel directory, hashing only new or modified files."""
+        found = {}
+        with os.scandir(os.path.join(self.transcripts_dir, channel)) as entries:
+            for dir_entry in entries:
+                video_id, extension = os.path.splitext(dir_entry.name)
+                if extension not in EXTENSIONS or not dir_entry.is_file():
+                    continue
+                previous = found.get(video_id)
+                if previous is not None and EXTENSIONS.index(previous.extension) < EXTENSIONS.index(extension):
+                    continue  # `.seg` wins over an older `.txt` of the same video
+
+                stat = dir_entry.stat()
+                known = self.entries.get(video_id)
+                if known is not None and (known.channel, known.extension, known.size, known.mtime_ns) == \
+                        (channel, extension, stat.st_size, stat.st_mtime_ns):
+                    found[video_id] = known
+                else:
+                    found[video_id] = Entry(channel, extension, stat.st_size, stat.st_mtime_ns,
+                                            file_sha1(dir_entry.path))
+        return found
+
+    def refresh(self, max_workers=MAX_WORKERS, full=False):
+        """Re-syncs the manifest with the directory tree, returns (added or changed, removed) counts.
+
+        Only channel directories with a new mtime are scanned, unless `full`.
+        """
+        if not os.path.isdir(self.transcripts_dir):
+            return 0, 0
+        self.flush()
+        with os.scandir(self.transcripts_dir) as entries:
+            channels = {entry.name: entry.stat().st_mtime_ns for entry in entries if entry.is_dir()}
+        stale = sorted(channel for channel, mtime_ns in channels.items()
+                       if full or self.channel_mtimes.get(channel) != mtime_ns)
+
+        # entries of unchanged directories are kept as they are
+        stale_set = set(stale)
+        scanned = {video_id: entry for video_id, entry in self.entries.items()
+                   if entry.channel in channels and entry.channel not in stale_set}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for found in executor.map(self.scan_channel, stale):
+                for video_id, entry in found.items():
+                    previous = scanned.get(video_id)
+                    # a video saved under two channel directories: keep the preferred extension
+                    if previous is None or EXTENSIONS.index(entry.extension) < EXTENSIONS.index(previous.extension):
+                        scanned[video_id] = entry
+
+        with self._lock:
+            changed = {video_id: entry for video_id, entry in scanned.items() if self.entries.get(video_id) != entry}
+            removed = self.entries.keys() - scanned.keys()
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                       [(video_id, *entry) for video_id, entry in changed.items()])
+                self._conn.executemany("DELETE FROM files WHERE video_id = ?", [(video_id,) for video_id in removed])
+                # mtimes taken before the scan: files added meanwhile get their directory rescanned next time
+                self._conn.executemany("INSERT OR REPLACE INTO channels VALUES (?, ?)",
+                                       [(channel, channels[channel]) for channel in stale])
+                self._conn.executemany("DELETE FROM channels WHERE channel = ?",
+                                       [(channel,) for channel in self.channel_mtimes.keys() - channels.keys()])
+            self.entries = scanned
+            self.channel_mtimes = channels
+        logging.info(f"📂 Corpus manifest: {len(scanned)} transcripts, {len(changed)} new or changed, "
+                     f"{len(removed)} removed ({len(stale)}/{len(channels)} channel directories scanned)")
+        return len(changed), len(removed)
+
+    def record(self, video_id, channel, extension, data):
+        """Registers a transcript file that was just written with `data`; stored on the next `flush`."""
+        stat = os.stat(os.path.join(self.transcripts_dir, channel, f"{video_id}{extension}"))
+        entry = Entry(channel, extension, stat.st_size, stat.st_mtime_ns, hashlib.sha1(data).hexdigest())
+        with self._lock:
+            self.entries[video_id] = entry
+            self._recorded[video_id] = entry
+
+    def flush(self):
+        # recorded files, one transaction
+        with self._lock:
+            if not self._recorded:
+                return
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                       [(video_id, *entry) for video_id, entry in self._recorded.items()])
+            self._recorded = {}
+
+    def size_histogram(self, bins_kb=SIZE_BINS_KB, by_channel=False):
+        """{channel or None: [count per size bucket]}, buckets are < bins_kb[0] KB, ..., >= bins_kb[-1] KB."""
+        bounds = [kb * 1024 for kb in bins_kb]
+        histograms = {}
+        for entry in self.entries.values():
+            counts = histograms.setdefault(entry.channel if by_channel else None, [0] * (len(bounds) + 1))
+            counts[bisect.bisect_right(bounds, entry.size)] += 1
+        return histograms
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def bucket_labels(bins_kb=SIZE_BINS_KB):
+    return ([f"< {bins_kb[0]} KB"]
+            + [f"{low} KB - {high} KB" for low, high in zip(bins_kb, bins_kb[1:])]
+            + [f">= {bins_kb[-1]} KB"])
+
+
+def print_histogram(manifest, bins_kb=SIZE_BINS_KB, by_channel=False):
+    labels = bucket_labels(bins_kb)
+    if by_channel:
+        for channel, counts in sorted(manifest.size_histogram(bins_kb, by_channel=True).items()):
+            print(f"Dir: {channel} - number of files: {sum(counts)}")
+            for label, count in zip(labels, counts):
+                print(f"  {label}: {count}")
+        print("")
+
+    counts = manifest.size_histogram(bins_kb).get(None, [0] * len(labels))
+    print("Summary by size:")
+    print("---------------------------")
+    for label, count in zip(labels, counts):
+        print(f"{label}: {count}")
+    print(f"Total: {sum(counts)} files, {sum(entry.size for entry in manifest.entries.values()) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    from common_logging import setup_logging
+
+    setup_logging(script_name="corpus_manifest")
+
+    parser = argparse.ArgumentParser(description="Transcript corpus inventory (replaces count_transcripts_by_size.sh)")
+    parser.add_argument("--transcripts", default=DEFAULT_TRANSCRIPTS_DIR,
+                        help="Transcripts directory (default: output/transcripts/)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Channel directories scanned in parallel (default: {MAX_WORKERS})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = subparsers.add_parser("refresh", help="Scan the transcripts directory and update the manifest")
+    refresh_parser.add_argument("--full", action="store_true",
+                                help="Rescan every channel directory, also finds files rewritten in place")
+
+    histogram_parser = subparsers.add_parser("histogram", help="Transcript size histogram (refreshes first)")
+    histogram_parser.add_argument("--by-channel", action="store_true", help="One histogram per channel directory")
+    histogram_parser.add_argument("--bins", type=int, nargs="+", default=list(SIZE_BINS_KB),
+                                  help=f"Bucket bounds in KB (default: {' '.join(map(str, SIZE_BINS_KB))})")
+
+    args = parser.parse_args()
+    manifest = CorpusManifest(args.transcripts)
+    try:
+        manifest.refresh(args.workers, full=args.command == "refresh" and args.full)
+        if args.command == "histogram":
+            print_histogram(manifest, sorted(args.bins), args.by_channel)
+    finally:
+        manifest.close()
@@ -1,8 +1,12 @@
+import argparse
 import logging
 import os
-from fetch_channel_videos import fetch_videos_from_channel
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from fetch_channel_videos import fetch_videos_from_channel, FULL_RESYNC_DAYS
 from fetch_playlist_videos import fetch_videos_from_playlist
 from common_logging import setup_logging
+from metrics import metrics, add_metrics_arguments, configure_metrics, write_run_report
 
 setup_logging()
 
@@ -12,6 +16,8 @@ OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 CHANNELS_FILE = os.path.join(BASE_DIR, "data", "channels.csv")
 PLAYLISTS_FILE = os.path.join(BASE_DIR, "data", "playlists.csv")
 
+MAX_WORKERS = 8  # sources fetched at once, each one is a chain of sequential API calls
+
 
 def load_ids(file_path):
     if not os.path.exists(file_path):
@@ -29,20 +35,60 @@ def load_ids(file_path):
                 ids.append(clean_id)
         return ids
 
-def fetch_all_channels():
-    channels = load_ids(CHANNELS_FILE)
-    for channel_id in channels:
-        logging.info(f"Fetching videos from channel: {channel_id}")
-        fetch_videos_from_channel(channel_id, os.path.join(OUTPUT_DIR, "midel.csv"))
+def channel_jobs(full_resync_days=FULL_RESYNC_DAYS):
+    fetch = partial(fetch_videos_from_channel, full_resync_days=full_resync_days)
+    return [("channel", channel_id, fetch, os.path.join(OUTPUT_DIR, "midel.csv"))
+            for channel_id in load_ids(CHANNELS_FILE)]
+
+def playlist_jobs(full_resync_days=FULL_RESYNC_DAYS):
+    fetch = partial(fetch_videos_from_playlist, full_resync_days=full_resync_days)
+    return [("playlist", playlist_id, fetch, os.path.join(OUTPUT_DIR, "playlist_videos.csv"))
+            for playlist_id in load_ids(PLAYLISTS_FILE)]
+
+def run_jobs(jobs, max_workers=MAX_WORKERS):
+    # one failing source is logged and does not stop the others
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for source_type, source_id, fetch, output_file in jobs:
+            logging.info(f"Fetching videos from {source_type}: {source_id}")
+            futures[executor.submit(fetch, source_id, output_file)] = (source_type, source_id)
+
+        for future in as_completed(futures):
+            source_type, source_id = futures[future]
+            try:
+                future.result()
+                metrics.inc("sources_fetched")
+            except Exception as e:
+                metrics.inc("sources_failed")
+                failed.append(source_id)
+                logging.error(f"❌ Failed to fetch {source_type} {source_id}: {e}")
 
-def fetch_all_playlists():
-    playlists = load_ids(PLAYLISTS_FILE)
-    for playlist_id in playlists:
-        logging.info(f"Fetching videos from playlist: {playlist_id}")
-        fetch_videos_from_playlist(playlist_id, os.path.join(OUTPUT_DIR, "playlist_videos.csv"))
+    logging.info(f"✅ Fetched {len(jobs) - len(failed)}/{len(jobs)} sources" + (f", failed: {failed}" if failed else ""))
+    return failed
+
+def fetch_all_channels(max_workers=MAX_WORKERS, full_resync_days=FULL_RESYNC_DAYS):
+    return run_jobs(channel_jobs(full_resync_days), max_workers)
+
+def fetch_all_playlists(max_workers=MAX_WORKERS, full_resync_days=FULL_RESYNC_DAYS):
+    return run_jobs(playlist_jobs(full_resync_days), max_workers)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch video lists of all configured channels and playlists")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Sources fetched concurrently (default: {MAX_WORKERS})")
+    parser.add_argument("--full-resync-days", type=int, default=FULL_RESYNC_DAYS,
+                        help=f"Page through a whole source again if its last full sync is older (default: {FULL_RESYNC_DAYS}, 0 = never)")
+    parser.add_argument("--full", action="store_true", help="Full resync of every source now")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    full_resync_days = -1 if args.full else args.full_resync_days  # any negative age is "due"
+
     logging.info("Start fetching...")
-    fetch_all_channels()
-    fetch_all_playlists()
+    try:
+        with metrics.stage("fetch_all"):
+            run_jobs(channel_jobs(full_resync_days) + playlist_jobs(full_resync_days), args.workers)
+    finally:
+        write_run_report("fetch_all", args.metrics_dir, workers=args.workers, full_resync_days=full_resync_days)
     logging.info("Fetching ended!")
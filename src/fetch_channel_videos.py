@@ -1,21 +1,20 @@
 import logging
 
-from common import get_youtube_service, save_to_csv, get_channel_id_by_name
+from common import get_youtube_service, save_to_csv, get_channel_id_by_name, fetch_playlist_snippets, execute
 from common_logging import setup_logging
-from common_cache import get_last_fetched_date, update_last_fetched_date
+from common_cache import get_last_fetched_date, update_last_fetched_date, needs_full_resync, update_last_full_sync
 
 setup_logging()
 
-def fetch_videos_from_channel(channel_identifier, output_file):
+FULL_RESYNC_DAYS = 30  # every source is paged through completely this often, None/0 disables
+
+def fetch_videos_from_channel(channel_identifier, output_file, full_resync_days=FULL_RESYNC_DAYS):
     youtube = get_youtube_service()
     videos = []
 
     channel_id = channel_identifier
     channel_name = None
 
-    last_fetched_date = get_last_fetched_date("channels", channel_id)
-    logging.info(f"Last fetching was for {channel_name} ({channel_id}): {last_fetched_date}")
-
     if not channel_identifier.startswith("UC"):
         logging.info(f"Looking up channel ID for name: {channel_identifier}")
         channel_id = get_channel_id_by_name(channel_identifier)
@@ -26,7 +25,7 @@ def fetch_videos_from_channel(channel_identifier, output_file):
             part="snippet",
             id=channel_id
         )
-        response = request.execute()
+        response = execute(request)
         if "items" in response and response["items"]:
             channel_name = response["items"][0]["snippet"]["title"]
         else:
@@ -38,7 +37,7 @@ def fetch_videos_from_channel(channel_identifier, output_file):
         part="contentDetails",
         id=channel_id
     )
-    response = request.execute()
+    response = execute(request)
 
     if "items" not in response or not response["items"]:
         raise ValueError(f"Failed to retrieve 'Uploads' playlist for {channel_name}")
@@ -46,27 +45,24 @@ def fetch_videos_from_channel(channel_identifier, output_file):
     uploads_playlist_id = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
     logging.info(f"Uploads playlist ID for {channel_name}: {uploads_playlist_id}")
 
-    # Fetching all videos for "Uploads" playlist
-    request = youtube.playlistItems().list(
-        part="snippet",
-        playlistId=uploads_playlist_id,
-        maxResults=50
-    )
+    # "Uploads" are listed newest first: paging stops at the cached watermark, except on a full resync
+    full_resync = needs_full_resync("channels", channel_id, full_resync_days)
+    last_fetched_date = None if full_resync else get_last_fetched_date("channels", channel_id)
+    logging.info(f"Last fetching was for {channel_name} ({channel_id}): {last_fetched_date}"
+                 + (" (full resync)" if full_resync else ""))
 
-    while request:
-        response = request.execute()
-        for item in response.get("items", []):
-            snippet = item["snippet"]
-            video_data = {
-                "video_id": snippet["resourceId"]["videoId"],
-                "title": snippet["title"],
-                "description": snippet["description"],
-                "published_at": snippet["publishedAt"],
-                "channel_id": channel_id,
-                "channel_name": channel_name,
-            }
-            videos.append(video_data)
-        request = youtube.playlistItems().list_next(request, response)
+    snippets, pages = fetch_playlist_snippets(youtube, uploads_playlist_id, last_fetched_date)
+    for snippet in snippets:
+        video_data = {
+            "video_id": snippet["resourceId"]["videoId"],
+            "title": snippet["title"],
+            "description": snippet["description"],
+            "published_at": snippet["publishedAt"],
+            "channel_id": channel_id,
+            "channel_name": channel_name,
+        }
+        videos.append(video_data)
+    logging.info(f"Read {pages} pages of uploads for {channel_name}")
 
     headers = ["video_id", "title", "description", "published_at", "channel_id", "channel_name"]
     save_to_csv(output_file, videos, headers=headers)
@@ -77,6 +73,8 @@ def fetch_videos_from_channel(channel_identifier, output_file):
         newest_date = max(video["published_at"] for video in videos)
         update_last_fetched_date("channels", channel_id, newest_date)
         logging.info(f"📝 Cache updated for {channel_name}: {newest_date}")
+    if full_resync:
+        update_last_full_sync("channels", channel_id)
 
 
 if __name__ == "__main__":
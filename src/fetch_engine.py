@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import metrics
+
+
+class Throttled(Exception):
+    """The remote side asked us to slow down (HTTP 429 / TooManyRequests)."""
+
+
+################
+### LIMITER ###
+################
+class AdaptiveRateLimiter:
+    """Token bucket shared by all fetch tasks, with AIMD rate control.
+
+    Every success raises the rate additively (about `increase` req/s per second
+    of clean traffic); a throttle halves it (`decrease`) and pauses everybody
+    for `cooldown` seconds. Throttles arriving during a cooldown are one event.
+    """
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, increase=0.05, decrease=0.5, burst=1.0, cooldown=10.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.cooldown = cooldown
+        self.throttle_events = 0
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:  # waiters are served in FIFO order
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return  # same throttling episode, already backed off
+
+        self.throttle_events += 1
+        metrics.inc("throttle_episodes")
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._tokens = 0
+        self._blocked_until = now + self.cooldown
+        logging.warning(f"🚨 Throttled, backing off for {self.cooldown:.0f}s, rate now {self.rate:.2f} req/s")
+
+
+##################
+### TRANSPORTS ###
+##################
+class YouTubeTranscriptTransport:
+    """youtube_transcript_api (blocking) run in worker threads."""
+
+    async def fetch(self, video_id, language_codes):
+        return await asyncio.to_thread(self._fetch, video_id, language_codes)
+
+    @staticmethod
+    def _fetch(video_id, language_codes):
+        from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, TooManyRequests
+
+        try:
+            return YouTubeTranscriptApi.get_transcript(video_id, languages=language_codes)
+        except TooManyRequests as e:
+            raise Throttled(str(e))
+        except TranscriptsDisabled:
+            logging.debug(f"❌ Transcripts are disabled for video {video_id}.")
+        except NoTranscriptFound:
+            logging.debug(f"❌ No transcripts available for video {video_id} in {language_codes}")
+        except Exception as e:
+            logging.error(f"❌❌ Unexpected error while fetching transcript for {video_id}: {e}")
+        return None
+
+
+class HttpStubTransport:
+    """Fetches `GET <base_url>/transcripts/<video_id>?languages=pl` (e.g. from `fetch_engine.py stub-server`).
+
+    200 -> JSON list of {text, start, duration}, 404 -> no transcript, 429 -> throttled.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    async def fetch(self, video_id, language_codes):
+        return await asyncio.to_thread(self._fetch, video_id, language_codes)
+
+    def _fetch(self, video_id, language_codes):
+        query = urllib.parse.urlencode({"languages": ",".join(language_codes)})
+        url = f"{self.base_url}/transcripts/{urllib.parse.quote(video_id)}?{query}"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise Throttled(f"HTTP 429 for {video_id}")
+            if e.code != 404:
+                logging.error(f"❌❌ Unexpected HTTP {e.code} while fetching transcript for {video_id}")
+            return None
+
+
+##############
+### ENGINE ###
+##############
+async def fetch_with_retry(video_id, language_codes, transport, limiter, max_throttle_retries=5):
+    """Returns (transcript or None, throttled). Throttled requests are retried, not reported as missing."""
+    for _ in range(max_throttle_retries + 1):
+        await limiter.acquire()
+        metrics.inc("transcript_requests")
+        start = time.perf_counter()
+        try:
+            transcript = await transport.fetch(video_id, language_codes)
+        except Throttled:
+            metrics.inc("transcript_throttled")  # every 429, not only the episodes
+            limiter.on_throttle()
+            continue
+        finally:
+            metrics.observe("transcript_request_seconds", time.perf_counter() - start)
+        limiter.on_success()
+        return transcript, False
+    return None, True
+
+
+async def run_bounded(items, worker, concurrency):
+    """Runs `await worker(item)` for every item with at most `concurrency` in flight, yields results."""
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    results = asyncio.Queue()
+
+    async def consume():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await results.put((item, await worker(item), None))
+            except Exception as e:
+                await results.put((item, None, e))
+
+    tasks = [asyncio.create_task(consume()) for _ in range(concurrency)]
+    done = asyncio.gather(*tasks)
+    remaining = queue.qsize()
+    while remaining:
+        yield await results.get()
+        remaining -= 1
+    await done
+
+
+###################
+### STUB SERVER ###
+###################
+def run_stub_server(port, max_rate, missing_every):
+    """Local transcript endpoint for testing the engine: answers 429 above `max_rate` req/s."""
+    lock = threading.Lock()
+    window = {"start": time.monotonic(), "count": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            video_id = urllib.parse.urlparse(self.path).path.rsplit("/", 1)[-1]
+            with lock:
+                now = time.monotonic()
+                if now - window["start"] >= 1:
+                    window["start"], window["count"] = now, 0
+                window["count"] += 1
+                throttled = window["count"] > max_rate
+
+            if throttled:
+                self.send_response(429)
+                self.end_headers()
+                return
+            if missing_every and sum(map(ord, video_id)) % missing_every == 0:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            body = json.dumps([{"text": f"transkrypcja {video_id} część {i}", "start": i * 2.5, "duration": 2.5}
+                               for i in range(20)]).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    logging.info(f"🧪 Stub transcript server on http://127.0.0.1:{port} (max {max_rate} req/s)")
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    from common_logging import setup_logging
+
+    setup_logging(script_name="fetch_engine")
+
+    parser = argparse.ArgumentParser(description="Transcript fetch engine tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    stub_parser = subparsers.add_parser("stub-server", help="Run a local throttling transcript endpoint")
+    stub_parser.add_argument("--port", type=int, default=8765)
+    stub_parser.add_argument("--max-rate", type=float, default=5.0, help="Requests per second before 429s")
+    stub_parser.add_argument("--missing-every", type=int, default=7, help="Every n-th video has no transcript")
+
+    args = parser.parse_args()
+    if args.command == "stub-server":
+        run_stub_server(args.port, args.max_rate, args.missing_every)
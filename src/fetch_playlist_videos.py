@@ -1,19 +1,20 @@
 import logging
 
-from common import get_youtube_service, save_to_csv
+from common import get_youtube_service, save_to_csv, fetch_playlist_snippets, execute
 from common_logging import setup_logging
-from common_cache import get_last_fetched_date, update_last_fetched_date
+from common_cache import get_last_fetched_date, update_last_fetched_date, needs_full_resync, update_last_full_sync
+from fetch_channel_videos import FULL_RESYNC_DAYS
 
 setup_logging()
 
-def fetch_videos_from_playlist(playlist_id, output_file):
+def fetch_videos_from_playlist(playlist_id, output_file, full_resync_days=FULL_RESYNC_DAYS):
     youtube = get_youtube_service()
     videos = []
 
-    playlist_info = youtube.playlists().list(
+    playlist_info = execute(youtube.playlists().list(
         part="snippet",
         id=playlist_id
-    ).execute()
+    ))
 
     if "items" in playlist_info and playlist_info["items"]:
         channel_id = playlist_info["items"][0]["snippet"]["channelId"]
@@ -21,34 +22,24 @@ def fetch_videos_from_playlist(playlist_id, output_file):
     else:
         raise ValueError(f"Playlist with ID '{playlist_id}' not found.")
 
-    last_fetched_date = get_last_fetched_date("playlists", playlist_id)
-    logging.info(f"Last fetching for playlist {playlist_id} ({channel_name}): {last_fetched_date}")
-
-    request = youtube.playlistItems().list(
-        part="snippet",
-        playlistId=playlist_id,
-        maxResults=50
-    )
-    while request:
-        response = request.execute()
-        for item in response['items']:
-            video_id = item['snippet']['resourceId']['videoId']
-            published_at = item['snippet']['publishedAt']
-
-            if last_fetched_date and published_at <= last_fetched_date:
-                continue  # skip because (by cache data) it has been already downloaded
-
-            video_data = {
-                "video_id": video_id,
-                "title": item['snippet']['title'],
-                "description": item['snippet']['description'],
-                "published_at": published_at,
-                "channel_id": channel_id,
-                "channel_name": channel_name,
-            }
-            videos.append(video_data)
-
-        request = youtube.playlistItems().list_next(request, response)
+    full_resync = needs_full_resync("playlists", playlist_id, full_resync_days)
+    last_fetched_date = None if full_resync else get_last_fetched_date("playlists", playlist_id)
+    logging.info(f"Last fetching for playlist {playlist_id} ({channel_name}): {last_fetched_date}"
+                 + (" (full resync)" if full_resync else ""))
+
+    # items older than the watermark are skipped (by cache data they have been already downloaded)
+    snippets, pages = fetch_playlist_snippets(youtube, playlist_id, last_fetched_date)
+    for snippet in snippets:
+        video_data = {
+            "video_id": snippet['resourceId']['videoId'],
+            "title": snippet['title'],
+            "description": snippet['description'],
+            "published_at": snippet['publishedAt'],
+            "channel_id": channel_id,
+            "channel_name": channel_name,
+        }
+        videos.append(video_data)
+    logging.info(f"Read {pages} pages of playlist {playlist_id}")
 
     headers = ["video_id", "title", "description", "published_at", "channel_id", "channel_name"]
     save_to_csv(output_file, videos, headers=headers)
@@ -58,6 +49,8 @@ def fetch_videos_from_playlist(playlist_id, output_file):
         newest_date = max(video["published_at"] for video in videos)
         update_last_fetched_date("playlists", playlist_id, newest_date)
         logging.info(f"Cache updated for playlist {playlist_id}: {newest_date}")
+    if full_resync:
+        update_last_full_sync("playlists", playlist_id)
 
 if __name__ == "__main__":
     playlist_id = input("Enter playlist ID: ")
@@ -1,14 +1,22 @@
 import os
+import argparse
+import asyncio
 import logging
 import time
+from datetime import datetime
 
 import pandas as pd
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, TooManyRequests
 from common_logging import setup_logging
+from metrics import metrics, add_metrics_arguments, configure_metrics, write_run_report, DEFAULT_METRICS_DIR
 
-from common_cache import should_retry, record_failed_attempt, record_successful_attempt, load_failed_cache
+from common_cache import (record_failed_attempt, record_successful_attempt, load_failed_cache, save_failed_cache,
+                          start_failed_cache_saver, is_scheduled, pop_due_retries, requeue_retries, next_retries,
+                          given_up_count)
+from transcript_store import TranscriptStore, DEFAULT_CORPUS_DIR
+from corpus_manifest import CorpusManifest, write_transcript_file
+from transcript_segments import encode_segments, segments_from_fetch
+from fetch_engine import AdaptiveRateLimiter, YouTubeTranscriptTransport, HttpStubTransport, fetch_with_retry, run_bounded
 
 
 setup_logging(script_name="fetch_transcripts")
@@ -17,13 +25,21 @@ TRANSCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "../output/transcripts
 VIDEO_CSV_PATH = os.path.join(os.path.dirname(__file__), "../output/analyze_list.csv")
 
 LANGUAGE_CODES = ['pl']
-MAX_WORKERS = 5
+MAX_CONCURRENCY = 8  # requests in flight, the shared limiter decides how fast they go
+INITIAL_RATE = 2.0  # requests per second, ramped up (AIMD) until YouTube starts throttling
+MAX_RATE = 10.0
+RETRY_BATCH_WINDOW = 60  # --loop wakes up this long after the next due retry, to take the following ones with it
 
 os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
 
 # Load cache with failed download to reduce I/O
 load_failed_cache()
 
+# Packed corpus (`--packed`), None means one txt file per video
+_store = None
+# In-memory inventory of the per-video files, opened before the first pass when not packed
+_manifest = None
+
 def sanitize_filename(name):
     sanitized = name.replace(' ', '_')
     return re.sub(r'[<>:"/\\|?*]', '', sanitized)[:50]
@@ -38,47 +54,37 @@ def load_video_data(csv_path):
     return list(df[["video_id", "channel_id", "channel_name", "published_at"]].itertuples(index=False, name=None))
 
 
-def download_transcript(video_id, language_codes=LANGUAGE_CODES):
-    for lang in language_codes:
-        try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-            logging.debug(f"✅ Transcript found for video {video_id} in language '{lang}'")
-            return transcript
-        except TranscriptsDisabled:
-            logging.debug(f"❌ Transcripts are disabled for video {video_id}.")
-            return None
-        except NoTranscriptFound:
-            logging.debug(f"❌ No transcript available for video {video_id}.")
-            return None
-        except TooManyRequests:
-            logging.debug(f"🚨 Too many requests! YouTube API is blocking requests for video {video_id}.")
-            time.sleep(10)  # wait 10s for next request (but only on this thread!)
-            return None
-        except Exception as e:
-            logging.error(f"❌❌ Unexpected error while fetching transcript for {video_id}: {e}")
-            return None
-    logging.debug(f"❌ No transcripts available for video {video_id} in {language_codes}")
-    return None
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        _manifest = CorpusManifest(TRANSCRIPTS_DIR)
+        _manifest.refresh()  # incremental: only new or modified files are hashed
+    return _manifest
 
 
 def save_transcript(channel_id, video_id, transcript):
     if transcript is None:
         return False
 
+    # structured segments (start, duration, normalized text), normalized once here and not on every analysis
+    record = encode_segments(segments_from_fetch(transcript))
+
+    if _store is not None:
+        try:
+            _store.append(video_id, sanitize_filename(channel_id), record)
+            logging.debug(f"Transcript saved for video {video_id} -> {_store.corpus_dir}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to save transcript for {video_id}: {e}")
+            return False
+
     channel_dir = os.path.join(TRANSCRIPTS_DIR, sanitize_filename(channel_id))
     os.makedirs(channel_dir, exist_ok=True)
-    transcript_path = os.path.join(channel_dir, f"{video_id}.txt")
-
-    lines = []
-    for entry in transcript:
-        start_time = entry['start']
-        minutes, seconds = divmod(int(start_time), 60)
-        formatted_time = f"[{minutes}:{seconds:02d}]"
-        lines.append(f"{formatted_time} {entry['text']}")
+    transcript_path = os.path.join(channel_dir, f"{video_id}.seg")
 
     try:
-        with open(transcript_path, "w", encoding="utf-8") as file:
-            file.write("\n".join(lines))
+        write_transcript_file(transcript_path, record)
+        get_manifest().record(video_id, sanitize_filename(channel_id), ".seg", record)
         logging.debug(f"Transcript saved for video {video_id} -> {transcript_path}")
         return True
     except Exception as e:
@@ -86,20 +92,28 @@ def save_transcript(channel_id, video_id, transcript):
         return False
 
 
-def process_video(video):
-    video_id, channel_id, channel_name, published_at = video
+def transcript_exists(channel_id, video_id):
+    if _store is not None:
+        return video_id in _store
 
-    if not should_retry(video_id): # failed download caching: check
-        return channel_name, False, f"🚫 Skipping {video_id} from {channel_name} ({channel_id}) published at {published_at} - too many failed attempts."
+    # `.txt` files (saved before the structured format) count as well, see `corpus_manifest.EXTENSIONS`
+    return video_id in get_manifest()
 
-    transcript_path = os.path.join(TRANSCRIPTS_DIR, sanitize_filename(channel_id), f"{video_id}.txt")
 
-    if os.path.exists(transcript_path):
+async def process_video(video, transport, limiter):
+    video_id, channel_id, channel_name, published_at = video
+
+    if transcript_exists(channel_id, video_id):
         return channel_name, True, f"⏩ Already exists: {video_id} from {channel_name} ({channel_id}) published at {published_at}"
 
-    transcript = download_transcript(video_id, LANGUAGE_CODES)
+    transcript, throttled = await fetch_with_retry(video_id, LANGUAGE_CODES, transport, limiter)
+    if throttled:
+        # not the video's fault, so no failed attempt is recorded and the next run picks it up again
+        return channel_name, False, f"🚨 Still throttled, will retry next run: {video_id} from {channel_name} ({channel_id}) published at {published_at}"
+
     if transcript:
-        success = save_transcript(channel_id, video_id, transcript)
+        # encoding and disk writes run in a worker thread, the event loop keeps the other requests going
+        success = await asyncio.to_thread(save_transcript, channel_id, video_id, transcript)
         if success:
             record_successful_attempt(video_id) # failed download caching: removal
             return channel_name, True, f"✅ Downloaded transcript: {video_id} from {channel_name} ({channel_id}) published at {published_at}"
@@ -110,32 +124,127 @@ def process_video(video):
         return channel_name, False, f"❌ No transcript available: {video_id} from {channel_name} ({channel_id}) published at {published_at}"
 
 
-def fetch_transcripts():
-    video_data = load_video_data(VIDEO_CSV_PATH)
-    logging.info(f"🎥 Found {len(video_data)} videos to process.")
+def plan_videos(video_data):
+    """(videos to fetch, popped due retries): new videos plus failed ones whose retry is due.
 
+    The rest of the failed cache is not touched; the popped retries go back to `requeue_retries` after the pass.
+    """
+    due = pop_due_retries() # failed download caching: check
+    todo = [video for video in video_data if video[0] in due or not is_scheduled(video[0])]
+    waiting = len(video_data) - len(todo)
+    if waiting:
+        logging.info(f"🚫 Skipping {waiting} previously failed videos, not due for a retry yet "
+                     f"({given_up_count()} given up after too many failed attempts).")
+    return todo, due
+
+
+def log_next_retries():
+    next_time, count = next_retries()
+    if next_time is None:
+        logging.info("📅 No failed downloads scheduled for a retry.")
+    else:
+        logging.info(f"📅 Next retries eligible from {datetime.fromtimestamp(next_time):%Y-%m-%d %H:%M:%S} "
+                     f"({count} within the following 24h).")
+    return next_time
+
+
+async def fetch_transcripts_async(video_data, transport, concurrency=MAX_CONCURRENCY, rate=INITIAL_RATE, max_rate=MAX_RATE):
+    limiter = AdaptiveRateLimiter(rate=rate, max_rate=max_rate)
     downloaded = {}
     missing_transcripts = {}
+    done = set()
+
+    async for video, result, error in run_bounded(video_data, lambda video: process_video(video, transport, limiter), concurrency):
+        if error is not None:
+            logging.error(f"❌ Error processing video {video[0]}: {error}")
+            continue
+
+        channel_name, success, message = result
+        logging.info(message)
+        if success:
+            metrics.inc("transcripts_done")
+            downloaded[channel_name] = downloaded.get(channel_name, 0) + 1
+            done.add(video[0])
+        else:
+            metrics.inc("transcripts_not_fetched")
+            missing_transcripts[channel_name] = missing_transcripts.get(channel_name, 0) + 1
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(process_video, video): video for video in video_data}
+    logging.info(f"📈 Final request rate {limiter.rate:.2f} req/s, {limiter.throttle_events} throttling episodes")
+    return downloaded, missing_transcripts, done
 
-        for future in as_completed(futures):
-            try:
-                channel_name, success, message = future.result()
-                logging.info(message)
-                if success:
-                    downloaded[channel_name] = downloaded.get(channel_name, 0) + 1
-                else:
-                    missing_transcripts[channel_name] = missing_transcripts.get(channel_name, 0) + 1
-            except Exception as e:
-                video = futures[future]
-                logging.error(f"❌ Error processing video {video[0]}: {e}")
 
-    logging.info("📌 Transcript download process finished")
-    logging.info(f"✅ Downloaded transcripts: {downloaded}")
-    logging.info(f"❌ Missing transcripts: {missing_transcripts}")
+def fetch_transcripts(transport=None, concurrency=MAX_CONCURRENCY, rate=INITIAL_RATE, max_rate=MAX_RATE, loop=False,
+                      metrics_dir=DEFAULT_METRICS_DIR):
+    video_data = load_video_data(VIDEO_CSV_PATH)
+    logging.info(f"🎥 Found {len(video_data)} videos to process.")
+
+    transport = transport or YouTubeTranscriptTransport()
+    start_failed_cache_saver()
+    if _store is None:
+        get_manifest()  # scanned here, not on the first lookup inside the event loop
+    while True:
+        todo, due = plan_videos(video_data)
+        logging.info(f"🎯 {len(todo)} videos to fetch in this run.")
+        try:
+            with metrics.stage("fetch_transcripts"):
+                downloaded, missing_transcripts, done = asyncio.run(
+                    fetch_transcripts_async(todo, transport, concurrency, rate, max_rate))
+        finally:
+            requeue_retries(due)  # due videos that got no new attempt stay scheduled
+        save_failed_cache()
+        if _manifest is not None:
+            _manifest.flush()  # files saved in this pass, one transaction
+
+        logging.info("📌 Transcript download process finished")
+        logging.info(f"✅ Downloaded transcripts: {downloaded}")
+        logging.info(f"❌ Missing transcripts: {missing_transcripts}")
+
+        next_time = log_next_retries()
+        if loop:
+            # every pass of a long-lived run gets its own report, the textfile always shows the latest one
+            write_run_report("fetch_transcripts", metrics_dir, videos=len(todo), loop=True)
+            metrics.reset()
+        if not loop or next_time is None:
+            break
+
+        # long-lived mode: sleep until the next retry is due, then fetch only what is still missing
+        video_data = [video for video in video_data if video[0] not in done]
+        sleep_time = max(0, next_time + RETRY_BATCH_WINDOW - time.time())
+        logging.info(f"💤 Sleeping {sleep_time:.0f}s until the next retries.")
+        time.sleep(sleep_time)
+        if _manifest is not None:
+            _manifest.refresh()  # pick up files changed by others while sleeping
 
 
 if __name__ == "__main__":
-    fetch_transcripts()
+    parser = argparse.ArgumentParser(description="Download transcripts for videos from the analyze list")
+    parser.add_argument("--packed", action="store_true",
+                        help="Append transcripts to the packed corpus instead of one txt file per video")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR,
+                        help="Packed corpus directory (default: output/corpus/)")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help=f"Maximum requests in flight (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--rate", type=float, default=INITIAL_RATE,
+                        help=f"Initial requests per second (default: {INITIAL_RATE})")
+    parser.add_argument("--max-rate", type=float, default=MAX_RATE,
+                        help=f"Upper bound for the adaptive request rate (default: {MAX_RATE})")
+    parser.add_argument("--loop", action="store_true",
+                        help="Keep running: sleep until the next failed download is due for a retry")
+    parser.add_argument("--stub-url", default=None,
+                        help="Fetch from a local stub server (see `fetch_engine.py stub-server`) instead of YouTube")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+
+    if args.packed:
+        _store = TranscriptStore(args.corpus)
+    try:
+        fetch_transcripts(HttpStubTransport(args.stub_url) if args.stub_url else None,
+                          args.concurrency, args.rate, args.max_rate, args.loop, args.metrics_dir)
+    finally:
+        if not args.loop:
+            write_run_report("fetch_transcripts", args.metrics_dir, concurrency=args.concurrency)
+        if _store is not None:
+            _store.close()
+        if _manifest is not None:
+            _manifest.close()
@@ -1,9 +1,11 @@
+import csv
 import os
-import pandas as pd
 import logging
 import argparse
 from datetime import datetime
 from src.common_logging import setup_logging
+from src.video_catalog import VideoCatalog, COLUMNS, DEFAULT_CATALOG_PATH, source_name
+from src.video_filter import VideoFilter, DEFAULT_FILTER_CACHE_DIR
 
 setup_logging()
 
@@ -12,73 +14,53 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 CHANNEL_VIDEOS_CSV = os.path.join(BASE_DIR, "output", "channel_videos.csv")
 PLAYLIST_VIDEOS_CSV = os.path.join(BASE_DIR, "output", "playlist_videos.csv")
 OUTPUT_CSV = os.path.join(BASE_DIR, "output", "analyze_list.csv")
+CATALOG_PATH = DEFAULT_CATALOG_PATH
+FILTER_CACHE_DIR = DEFAULT_FILTER_CACHE_DIR
 
 DEFAULT_KEYWORDS = None
 DEFAULT_CHANNELS = ["Radio ZET"]
 DEFAULT_START_DATE = "2025-01-29"
 DEFAULT_END_DATE = None
+DEFAULT_SOURCES = [source_name(CHANNEL_VIDEOS_CSV), source_name(PLAYLIST_VIDEOS_CSV)]
 
-def load_video_data():
-    logging.info("🔄 Loading video lists...")
-    df_channels = pd.read_csv(CHANNEL_VIDEOS_CSV, dtype=str) if os.path.exists(CHANNEL_VIDEOS_CSV) else pd.DataFrame()
-    df_playlists = pd.read_csv(PLAYLIST_VIDEOS_CSV, dtype=str) if os.path.exists(
-        PLAYLIST_VIDEOS_CSV) else pd.DataFrame()
-
-    df = pd.concat([df_channels, df_playlists], ignore_index=True)
-    if df.empty:
-        logging.warning("⚠️ No video data found!")
-        return None
-
-    logging.info(f"📂 Loaded {len(df)} video records.")
-    return df
-
+def open_catalog():
+    catalog = VideoCatalog(CATALOG_PATH)
+    for csv_path in (CHANNEL_VIDEOS_CSV, PLAYLIST_VIDEOS_CSV):  # video lists saved before the catalog
+        if os.path.exists(csv_path) and not catalog.has_source(source_name(csv_path)):
+            catalog.import_csv(csv_path)
+    return catalog
 
-def filter_videos(df, keywords, channels, start_date, end_date):
-    conditions = []
 
-    # Filter by keywords (title OR description)
-    if keywords:
-        keyword_pattern = "|".join(keywords)
-        keyword_condition = (
-                df["title"].str.contains(keyword_pattern, case=False, na=False) |
-                df["description"].str.contains(keyword_pattern, case=False, na=False)
-        )
-        conditions.append(keyword_condition)
+def normalize_date(date):
+    # YYYY-MM-DD, zero-padded: the snapshot compares dates as strings; other formats raise ValueError
+    return datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d") if date else date
 
-    # Filter by channel names
-    if channels:
-        channel_condition = df["channel_name"].isin(channels)
-        conditions.append(channel_condition)
 
-    # Filter by date range
-    if start_date:
-        start_date = datetime.strptime(start_date, "%Y-%m-%d")
-        df["published_at"] = pd.to_datetime(df["published_at"], errors="coerce").dt.tz_localize(None)
-        conditions.append(df["published_at"] >= start_date)
+def filter_videos(catalog, keywords, channels, start_date, end_date, fold=False, sources=DEFAULT_SOURCES):
+    """Keywords (plain text, case-insensitive) match title OR description; all other filters are ANDed.
 
-    if end_date:
-        end_date = datetime.strptime(end_date, "%Y-%m-%d")
-        conditions.append(df["published_at"] <= end_date)
+    Only videos of the `sources` video lists are considered (default: channel and playlist videos).
+    """
+    start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+    rows = VideoFilter(catalog, FILTER_CACHE_DIR, sources).filter(keywords, channels, start_date, end_date, fold)
+    logging.info(f"✅ After filtering, {len(rows)} videos remain.")
+    return rows
 
-    # Apply all filters
-    if conditions:
-        df_filtered = df.loc[pd.concat(conditions, axis=1).all(axis=1)]
-    else:
-        df_filtered = df
 
-    logging.info(f"✅ After filtering, {len(df_filtered)} videos remain.")
-    return df_filtered
-
-
-def generate_analyze_list(keywords, channels, start_date, end_date, output_csv):
-    df = load_video_data()
-    if df is None:
-        return
+def generate_analyze_list(keywords, channels, start_date, end_date, output_csv, fold=False, sources=DEFAULT_SOURCES):
+    logging.info("🔄 Loading video lists...")
+    catalog = open_catalog()
+    try:
+        rows = filter_videos(catalog, keywords, channels, start_date, end_date, fold, sources)
+    finally:
+        catalog.close()
 
-    df_filtered = filter_videos(df, keywords, channels, start_date, end_date)
-    df_filtered.to_csv(output_csv, index=False, encoding="utf-8")
+    with open(output_csv, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
 
-    logging.info(f"✅ Saved {len(df_filtered)} videos to {output_csv}")
+    logging.info(f"✅ Saved {len(rows)} videos to {output_csv}")
 
 
 if __name__ == "__main__":
@@ -96,10 +78,16 @@ if __name__ == "__main__":
     parser.add_argument("--end-date", type=str,
                         default=DEFAULT_END_DATE,
                         help="End date for filtering videos (YYYY-MM-DD, optional)")
+    parser.add_argument("--fold-diacritics", action="store_true",
+                        help="Match keywords ignoring Polish diacritics (e.g. 'zolw' matches 'żółw')")
+    parser.add_argument("--sources", nargs="+",
+                        default=DEFAULT_SOURCES,
+                        help="Video lists to take videos from (default: channel_videos.csv playlist_videos.csv)")
     parser.add_argument("--output", type=str,
                         default=OUTPUT_CSV,
                         help="Output CSV file path")
 
     args = parser.parse_args()
 
-    generate_analyze_list(args.keywords, args.channels, args.start_date, args.end_date, args.output)
+    generate_analyze_list(args.keywords, args.channels, args.start_date, args.end_date, args.output,
+                          args.fold_diacritics, args.sources)
@@ -0,0 +1,233 @@
+import bisect
+import cProfile
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_METRICS_DIR = os.path.join(BASE_DIR, "output", "metrics")
+PROMETHEUS_PREFIX = "yt"
+
+# Upper bounds (le) of histogram buckets, +Inf is implicit
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+BYTES_BUCKETS = (1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+
+class StageTimer:
+    # `elapsed` is live while the stage runs, so progress / ETA log lines can use it
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def elapsed(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {"buckets": list(self.buckets), "counts": self.counts, "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    """Named stage timers, counters and histograms of one run, safe to update from any thread.
+
+    Stages accumulate (runs, total / min / max seconds), so a stage entered once per
+    video reports the whole run. `profile_stages` ("all" or stage names) runs those
+    stages under cProfile and dumps one .prof file per stage run into `profile_dir`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+        self.profile_stages = set()
+        self.profile_dir = os.path.join(DEFAULT_METRICS_DIR, "profiles")
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+
+    def enable_profiling(self, stages, profile_dir=None):
+        self.profile_stages = set(stages)
+        if profile_dir:
+            self.profile_dir = profile_dir
+
+    def is_profiled(self, name):
+        return "all" in self.profile_stages or name in self.profile_stages
+
+    @contextmanager
+    def stage(self, name):
+        timer = StageTimer(name)
+        # one profiler per thread at a time, nested stages are covered by the outer profile
+        profiler = None
+        if self.profile_stages and self.is_profiled(name) and not getattr(self._local, "profiling", False):
+            profiler = cProfile.Profile()
+            self._local.profiling = True
+            profiler.enable()
+        try:
+            yield timer
+        finally:
+            timer.end = time.perf_counter()
+            if profiler is not None:
+                profiler.disable()
+                self._local.profiling = False
+                self.dump_profile(name, profiler)
+            self.record_stage(name, timer.elapsed)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = {"runs": 1, "seconds": seconds, "min": seconds, "max": seconds}
+            else:
+                stage["runs"] += 1
+                stage["seconds"] += seconds
+                stage["min"] = min(stage["min"], seconds)
+                stage["max"] = max(stage["max"], seconds)
+
+    def dump_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{name}-{os.getpid()}-{time.time_ns()}.prof")
+        profiler.dump_stats(path)  # `python -m pstats <file>` or snakeviz
+        logging.info(f"🔬 Profile of stage {name} saved to {path}")
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            }
+
+    def report(self, script_name, **meta):
+        return {
+            "script": script_name,
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": time.time() - self.started,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            **meta,
+            **self.snapshot(),
+        }
+
+    def write_json(self, path, script_name, **meta):
+        write_atomic(path, json.dumps(self.report(script_name, **meta), indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path, script_name):
+        """Prometheus text exposition format, for the node_exporter textfile collector."""
+        snapshot = self.snapshot()
+        labels = f'script="{script_name}"'
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            lines.extend(f"{PROMETHEUS_PREFIX}_{name}{suffix}{{{sample_labels}}} {value}"
+                         for suffix, sample_labels, value in samples)
+
+        metric("run_timestamp_seconds", "gauge", "End of the last run", [("", labels, f"{time.time():.3f}")])
+        metric("run_duration_seconds", "gauge", "Wall time of the last run",
+               [("", labels, f"{time.time() - self.started:.6f}")])
+        if snapshot["stages"]:
+            metric("stage_seconds", "gauge", "Time spent in a pipeline stage during the last run",
+                   [("", f'{labels},stage="{name}"', f"{stage['seconds']:.6f}")
+                    for name, stage in sorted(snapshot["stages"].items())])
+            metric("stage_runs", "gauge", "Times a pipeline stage was entered during the last run",
+                   [("", f'{labels},stage="{name}"', stage["runs"]) for name, stage in sorted(snapshot["stages"].items())])
+        for name, value in sorted(snapshot["counters"].items()):
+            metric(prometheus_name(name), "gauge", f"{name} during the last run", [("", labels, value)])
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            samples, cumulative = [], 0
+            for bound, count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                samples.append(("_bucket", f'{labels},le="{bound}"', cumulative))
+            samples.append(("_sum", labels, f"{histogram['sum']:.6f}"))
+            samples.append(("_count", labels, histogram["count"]))
+            metric(prometheus_name(name), "histogram", f"{name} during the last run", samples)
+
+        write_atomic(path, "\n".join(lines) + "\n")
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        for name, stage in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            logging.info(f"⏱️ {name}: {stage['seconds']:.2f}s in {stage['runs']} run(s)")
+        if snapshot["counters"]:
+            logging.info("🔢 " + ", ".join(f"{name}={value}" for name, value in sorted(snapshot["counters"].items())))
+
+
+def prometheus_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def write_atomic(path, text):
+    # the textfile collector must never read a half-written file
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+# One registry per process, shared by every module of the run
+metrics = Metrics()
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="Run report (<script>.json) and Prometheus textfile (<script>.prom) directory "
+                             "(default: output/metrics/)")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                        help="Run these stages (or 'all') under cProfile, .prof files go to <metrics-dir>/profiles/")
+
+
+def configure_metrics(args):
+    if args.profile:
+        metrics.enable_profiling(args.profile, os.path.join(args.metrics_dir, "profiles"))
+
+
+def write_run_report(script_name, metrics_dir=DEFAULT_METRICS_DIR, **meta):
+    metrics.log_summary()
+    try:
+        metrics.write_json(os.path.join(metrics_dir, f"{script_name}.json"), script_name, **meta)
+        metrics.write_prometheus(os.path.join(metrics_dir, f"{script_name}.prom"), script_name)
+        logging.info(f"📊 Run metrics saved to {metrics_dir}")
+    except OSError as e:
+        logging.error(f"🚨 Could not write run metrics to {metrics_dir}: {e}")
@@ -0,0 +1,100 @@
+import os
+import argparse
+import logging
+import time
+from src.common_logging import setup_logging
+from src.analyzers.trend_rollups import TrendRollups, GRANULARITIES
+
+# Logging
+setup_logging(script_name="query_trends")
+
+# Script setup
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_ROLLUPS_DIR = os.path.join(BASE_DIR, "output", "word_trends_rollups")
+DEFAULT_TOP = 10
+
+
+def print_rows(rows):
+    for row in rows:
+        print("\t".join(f"{value:.2f}" if isinstance(value, float) else str(value) for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trend queries answered from the rollups of `--mode trend`")
+    parser.add_argument("--rollups", default=DEFAULT_ROLLUPS_DIR,
+                        help="Rollups directory (default: output/word_trends_rollups/)")
+
+    # options shared by every query
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--start", help="First day, YYYY-MM-DD (default: first day in the rollups)")
+    common.add_argument("--end", help="Last day, YYYY-MM-DD (default: last day in the rollups)")
+    common.add_argument("--channel", help="Only this channel_id (default: all channels)")
+    bucketed = argparse.ArgumentParser(add_help=False)
+    bucketed.add_argument("--granularity", choices=GRANULARITIES, default="day",
+                          help="Bucket size: day, ISO week or month (default: day)")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sum_parser = subparsers.add_parser("sum", parents=[common], help="Range sums of words (or the TOP words)")
+    sum_parser.add_argument("words", nargs="*")
+    sum_parser.add_argument("--top", type=int, default=DEFAULT_TOP,
+                            help=f"Without words: number of most frequent words (default: {DEFAULT_TOP})")
+
+    series_parser = subparsers.add_parser("series", parents=[common, bucketed], help="Counts of a word per bucket")
+    series_parser.add_argument("word")
+
+    rolling_parser = subparsers.add_parser("rolling", parents=[common, bucketed],
+                                           help="Rolling sums of a word over the last N buckets")
+    rolling_parser.add_argument("word")
+    rolling_parser.add_argument("--window", type=int, default=7,
+                                help="Buckets per window, the bucket holding --start counts in full (default: 7)")
+
+    top_parser = subparsers.add_parser("top", parents=[common, bucketed], help="TOP words of every bucket")
+    top_parser.add_argument("--top", type=int, default=DEFAULT_TOP,
+                            help=f"Words per bucket (default: {DEFAULT_TOP})")
+
+    rising_parser = subparsers.add_parser("rising", parents=[common],
+                                          help="Words whose daily rate from --start to --end grew most "
+                                               "against the baseline period")
+    rising_parser.add_argument("--baseline-start", required=True, help="First day of the baseline, YYYY-MM-DD")
+    rising_parser.add_argument("--baseline-end", required=True, help="Last day of the baseline, YYYY-MM-DD")
+    rising_parser.add_argument("--top", type=int, default=DEFAULT_TOP,
+                               help=f"Number of words (default: {DEFAULT_TOP})")
+    rising_parser.add_argument("--min-count", type=int, default=5,
+                               help="Skip words seen fewer times from --start to --end (default: 5)")
+
+    args = parser.parse_args()
+    if args.command == "rising" and not (args.start and args.end):
+        parser.error("rising requires --start and --end")
+    if args.command == "rolling" and args.window < 1:
+        parser.error("--window must be at least 1")
+    if not TrendRollups.exists(args.rollups):
+        parser.error(f"No rollups in {args.rollups}, run `analyze_transcripts.py --mode trend` first")
+
+    start_time = time.perf_counter()
+    rollups = TrendRollups(args.rollups)
+    if args.channel and not rollups.by_channel:
+        parser.error(f"Rollups in {args.rollups} have no per-channel split, rebuild them without --no-channel-rollups")
+    span = {"start": args.start, "end": args.end, "channel": args.channel}
+
+    if args.command == "sum":
+        counts = rollups.range_sum(args.words or None, **span)
+        rows = counts.items() if args.words else sorted(counts.items(), key=lambda item: -item[1])[:args.top]
+    elif args.command == "series":
+        rows = rollups.series(args.word, args.granularity, **span)
+    elif args.command == "rolling":
+        rows = rollups.rolling(args.word, args.window, args.granularity, **span)
+    elif args.command == "top":
+        rows = [(bucket, ", ".join(f"{word} ({count})" for word, count in words))
+                for bucket, words in rollups.top_k(args.top, args.granularity, **span)]
+    elif args.command == "rising":
+        rows = rollups.rising(args.top, args.start, args.end, args.baseline_start, args.baseline_end,
+                              channel=args.channel, min_count=args.min_count)
+    else:
+        raise Exception("args.command problem")
+
+    logging.info(f"⏱️ Query answered in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    print_rows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import re
+import struct
+import sys
+from array import array
+
+# Binary transcript record:
+#   b"YTS1" | uint32 n | uint32[n] start_ms | uint32[n] duration_ms | uint32[n] text bytes | texts joined by "\n"
+# All integers are little-endian. Texts are normalized (lowercase, single spaces) once, at fetch time,
+# so the text block is exactly what the analyzers consume.
+MAGIC = b"YTS1"
+_HEADER = struct.Struct("<4sI")
+
+LEGACY_LINE_RE = re.compile(r"^\[(\d+):(\d{2})\]\s?(.*)$")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _WHITESPACE_RE.sub(" ", text.lower()).strip()
+
+
+def _little_endian(values):
+    packed = array("I", values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed
+
+
+def is_structured(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_segments(segments):
+    """(start_ms, duration_ms, text) segments -> binary record, texts are normalized here."""
+    texts = [normalize_text(text).encode("utf-8") for _, _, text in segments]
+    return b"".join([
+        _HEADER.pack(MAGIC, len(segments)),
+        _little_endian(start_ms for start_ms, _, _ in segments).tobytes(),
+        _little_endian(duration_ms for _, duration_ms, _ in segments).tobytes(),
+        _little_endian(len(text) for text in texts).tobytes(),
+        b"\n".join(texts),
+    ])
+
+
+def _columns(data):
+    _, count = _HEADER.unpack_from(data)
+    columns = []
+    offset = _HEADER.size
+    for _ in range(3):
+        column = array("I")
+        column.frombytes(bytes(data[offset:offset + 4 * count]))
+        if sys.byteorder != "little":
+            column.byteswap()
+        columns.append(column)
+        offset += 4 * count
+    return columns, offset
+
+
+def decode_text(data):
+    # Normalized full text, a plain slice + decode (no per-run regex)
+    _, count = _HEADER.unpack_from(data)
+    return str(data[_HEADER.size + 12 * count:], "utf-8")
+
+
+def decode_segments(data):
+    (starts, durations, lengths), offset = _columns(data)
+    segments = []
+    for start_ms, duration_ms, length in zip(starts, durations, lengths):
+        segments.append((start_ms, duration_ms, str(data[offset:offset + length], "utf-8")))
+        offset += length + 1  # "\n" separator
+    return segments
+
+
+def segments_from_fetch(transcript):
+    # youtube_transcript_api entries: {"text", "start", "duration"} with seconds as floats
+    return [(round(entry["start"] * 1000), round(entry.get("duration", 0) * 1000), entry["text"])
+            for entry in transcript]
+
+
+def segments_from_legacy(raw_text):
+    """`[m:ss] text` lines -> segments; durations are inferred from the next start (0 for the last one)."""
+    parsed = []
+    for line in raw_text.splitlines():
+        match = LEGACY_LINE_RE.match(line)
+        if match:
+            minutes, seconds, text = match.groups()
+            parsed.append([(int(minutes) * 60 + int(seconds)) * 1000, text.strip()])
+        elif parsed:
+            parsed[-1][1] = f"{parsed[-1][1]} {line.strip()}".strip()
+        elif line.strip():
+            parsed.append([0, line.strip()])
+
+    segments = []
+    for idx, (start_ms, text) in enumerate(parsed):
+        next_start = parsed[idx + 1][0] if idx + 1 < len(parsed) else start_ms
+        segments.append((start_ms, max(0, next_start - start_ms), text))
+    return segments
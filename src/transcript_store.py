@@ -0,0 +1,182 @@
+import argparse
+import logging
+import mmap
+import os
+import threading
+
+try:  # imported as `src.transcript_store` by the analyzers, as `transcript_store` by the fetch scripts
+    from src.transcript_segments import encode_segments, segments_from_legacy
+except ImportError:
+    from transcript_segments import encode_segments, segments_from_legacy
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CORPUS_DIR = os.path.join(BASE_DIR, "output", "corpus")
+DEFAULT_TRANSCRIPTS_DIR = os.path.join(BASE_DIR, "output", "transcripts")
+
+INDEX_FILE = "index.tsv"
+SEGMENT_SIZE = 256 * 1024 * 1024  # a new segment file is started above this size
+
+
+def segment_name(segment):
+    return f"seg-{segment:05d}.dat"
+
+
+class TranscriptStore:
+    """Append-only packed transcript corpus.
+
+    Transcripts are appended to large segment files; `index.tsv` is an
+    append-only log of `video_id, channel_id, segment, offset, length` lines
+    (the last line for a video wins). Reads go through mmap, and a full scan
+    in (segment, offset) order is sequential I/O over a few big files.
+    """
+
+    def __init__(self, corpus_dir=DEFAULT_CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        self.index = {}  # video_id -> (channel_id, segment, offset, length)
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._segment = 0
+        self._segment_file = None
+        self._index_file = None
+        self.load_index()
+
+    @staticmethod
+    def exists(corpus_dir):
+        return os.path.exists(os.path.join(corpus_dir, INDEX_FILE))
+
+    def load_index(self):
+        index_path = os.path.join(self.corpus_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 5:
+                    continue  # torn last line after a crash, its record is simply lost
+                video_id, channel_id, segment, offset, length = parts
+                self.index[video_id] = (channel_id, int(segment), int(offset), int(length))
+                self._segment = max(self._segment, int(segment))
+
+        logging.info(f"📂 Packed corpus {self.corpus_dir}: {len(self.index)} transcripts")
+
+    def __contains__(self, video_id):
+        return video_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def location(self, video_id):
+        return self.index.get(video_id)
+
+    def append(self, video_id, channel_id, data):
+        # `data` is a structured record (see transcript_segments.py), legacy text is stored as UTF-8
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._lock:
+            if self._index_file is None:
+                os.makedirs(self.corpus_dir, exist_ok=True)
+                self._index_file = open(os.path.join(self.corpus_dir, INDEX_FILE), "a", encoding="utf-8")
+
+            segment_path = os.path.join(self.corpus_dir, segment_name(self._segment))
+            if self._segment_file is None and os.path.exists(segment_path) \
+                    and os.path.getsize(segment_path) >= SEGMENT_SIZE:
+                self._segment += 1
+                segment_path = os.path.join(self.corpus_dir, segment_name(self._segment))
+            if self._segment_file is None:
+                self._segment_file = open(segment_path, "ab")
+
+            offset = self._segment_file.tell()
+            self._segment_file.write(data)
+            self._segment_file.flush()  # data first, so the index never points past the segment end
+            self._index_file.write(f"{video_id}\t{channel_id}\t{self._segment}\t{offset}\t{len(data)}\n")
+            self._index_file.flush()
+            self.index[video_id] = (channel_id, self._segment, offset, len(data))
+
+            if offset + len(data) >= SEGMENT_SIZE:
+                self._segment_file.close()
+                self._segment_file = None
+                self._segment += 1
+
+    def _map(self, segment, end):
+        # (re)maps a segment, segments still being appended to can outgrow an older map
+        segment_map = self._maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            with open(os.path.join(self.corpus_dir, segment_name(segment)), "rb") as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = segment_map
+        return segment_map
+
+    def read_bytes(self, video_id):
+        location = self.index.get(video_id)
+        if location is None:
+            return None
+
+        _, segment, offset, length = location
+        if not length:
+            return memoryview(b"")
+        with self._lock:
+            segment_map = self._map(segment, offset + length)
+        return memoryview(segment_map)[offset:offset + length]
+
+    def scan_order(self, video_ids):
+        # video_ids sorted by physical position, unknown ones last
+        return sorted(video_ids, key=lambda video_id: self.index.get(video_id, ("", float("inf"), 0, 0))[1:3])
+
+    def close(self):
+        with self._lock:
+            for handle in (self._segment_file, self._index_file):
+                if handle is not None:
+                    handle.close()
+            self._segment_file = self._index_file = None
+            self._maps.clear()  # maps are closed once their memoryviews are released
+
+
+def migrate(transcripts_dir, corpus_dir):
+    """Packs a `<channel>/<video_id>.seg|.txt` tree into the corpus, skipping videos already packed.
+
+    Legacy `.txt` transcripts are converted to structured records on the way.
+    """
+    store = TranscriptStore(corpus_dir)
+    added = skipped = 0
+    for channel in sorted(os.scandir(transcripts_dir), key=lambda entry: entry.name):
+        if not channel.is_dir():
+            continue
+        for entry in sorted(os.scandir(channel.path), key=lambda entry: entry.name):
+            video_id, extension = os.path.splitext(entry.name)
+            if extension not in (".seg", ".txt"):
+                continue
+            if video_id in store:
+                skipped += 1
+                continue
+            if extension == ".seg":
+                with open(entry.path, "rb") as f:
+                    store.append(video_id, channel.name, f.read())
+            else:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    store.append(video_id, channel.name, encode_segments(segments_from_legacy(f.read())))
+            added += 1
+            if added % 1000 == 0:
+                logging.info(f"📦 Packed {added} transcripts...")
+
+    store.close()
+    logging.info(f"✅ Migration finished: {added} transcripts packed, {skipped} already in {corpus_dir}")
+
+
+if __name__ == "__main__":
+    from common_logging import setup_logging
+
+    setup_logging(script_name="transcript_store")
+
+    parser = argparse.ArgumentParser(description="Packed transcript corpus tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Pack the one-txt-per-video tree into the corpus")
+    migrate_parser.add_argument("--transcripts", default=DEFAULT_TRANSCRIPTS_DIR,
+                                help="Transcripts directory (default: output/transcripts/)")
+    migrate_parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR,
+                                help="Packed corpus directory (default: output/corpus/)")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate(args.transcripts, args.corpus)
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import logging
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CATALOG_PATH = os.path.join(BASE_DIR, "output", "video_catalog.sqlite")
+
+COLUMNS = ["video_id", "title", "description", "published_at", "channel_id", "channel_name"]
+
+
+def source_name(file_name):
+    # a source is the CSV a video list used to be appended to (midel.csv, playlist_videos.csv, ...)
+    return os.path.basename(file_name)
+
+
+class VideoCatalog:
+    """Local catalog of fetched videos (SQLite in WAL mode).
+
+    `videos` holds one row per video_id (upserted, the latest metadata wins),
+    `sources` records which video lists (CSV files) a video belongs to, so the
+    per-file CSV exports keep their old content. Ingest cost is one indexed
+    lookup per incoming row, the existing rows are never rescanned.
+    """
+
+    def __init__(self, catalog_path=DEFAULT_CATALOG_PATH):
+        self.catalog_path = catalog_path
+        os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(catalog_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, title TEXT, description TEXT,"
+            " published_at TEXT, channel_id TEXT, channel_name TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_videos_channel_name ON videos (channel_name);"
+            "CREATE INDEX IF NOT EXISTS idx_videos_published_at ON videos (published_at);"
+            "CREATE TABLE IF NOT EXISTS sources (source TEXT NOT NULL, video_id TEXT NOT NULL,"
+            " PRIMARY KEY (source, video_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    def revision(self):
+        # bumped by every upsert that writes rows, snapshots and cached query results are keyed by it
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    def has_source(self, source):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sources WHERE source = ? LIMIT 1", (source,)).fetchone() is not None
+
+    def upsert(self, rows, source):
+        """Inserts or updates `rows` (dicts with COLUMNS) in one transaction, returns the rows new to `source`."""
+        rows = list({row["video_id"]: row for row in rows}.values())
+        with self._lock, self._conn:
+            known = set()
+            for start in range(0, len(rows), 500):  # stay below SQLite's bound parameter limit
+                batch = [row["video_id"] for row in rows[start:start + 500]]
+                known.update(video_id for video_id, in self._conn.execute(
+                    f"SELECT video_id FROM sources WHERE source = ? AND video_id IN ({','.join('?' * len(batch))})",
+                    (source, *batch)))
+
+            self._conn.executemany(
+                f"INSERT INTO videos ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+                " ON CONFLICT (video_id) DO UPDATE SET "
+                + ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:]),
+                [tuple(row.get(column) for column in COLUMNS) for row in rows],
+            )
+            new_rows = [row for row in rows if row["video_id"] not in known]
+            self._conn.executemany("INSERT INTO sources (source, video_id) VALUES (?, ?)",
+                                   [(source, row["video_id"]) for row in new_rows])
+            if rows:
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('revision', 1)"
+                                   " ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+        return new_rows
+
+    def import_csv(self, csv_path, source=None):
+        with open(csv_path, "r", encoding="utf-8", newline="") as file:
+            rows = [row for row in csv.DictReader(file) if row.get("video_id")]
+        new_rows = self.upsert(rows, source or source_name(csv_path))
+        logging.info(f"📥 Imported {len(new_rows)} new videos from {csv_path} into the catalog")
+        return len(new_rows)
+
+    def query(self, channels=None, start=None, end=None, source=None):
+        """Rows (tuples of COLUMNS) filtered on the indexed columns, ordered by published_at.
+
+        `start` / `end` are compared as ISO strings (inclusive), e.g. "2025-01-29" or "2025-01-29T00:00:00Z".
+        """
+        conditions, params = [], []
+        if channels:
+            conditions.append(f"channel_name IN ({','.join('?' * len(channels))})")
+            params.extend(channels)
+        if start:
+            conditions.append("published_at >= ?")
+            params.append(start)
+        if end:
+            conditions.append("published_at <= ?")
+            params.append(end)
+        if source:
+            conditions.append("video_id IN (SELECT video_id FROM sources WHERE source = ?)")
+            params.append(source)
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM videos"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            return self._conn.execute(sql + " ORDER BY published_at", params).fetchall()
+
+    def get_rows(self, video_ids):
+        # rows (tuples of COLUMNS) in the order of `video_ids`, unknown ids are skipped
+        found = {}
+        with self._lock:
+            for start in range(0, len(video_ids), 500):
+                batch = video_ids[start:start + 500]
+                for row in self._conn.execute(
+                        f"SELECT {', '.join(COLUMNS)} FROM videos WHERE video_id IN ({','.join('?' * len(batch))})", batch):
+                    found[row[0]] = row
+        return [found[video_id] for video_id in video_ids if video_id in found]
+
+    def export_csv(self, csv_path, source=None):
+        rows = self.query(source=source)
+        with open(csv_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+        logging.info(f"📤 Exported {len(rows)} videos to {csv_path}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    from common_logging import setup_logging
+
+    setup_logging(script_name="video_catalog")
+
+    parser = argparse.ArgumentParser(description="Video catalog tools")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH,
+                        help="Catalog database (default: output/video_catalog.sqlite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import video list CSVs (one source per file)")
+    import_parser.add_argument("csv_files", nargs="+")
+
+    export_parser = subparsers.add_parser("export", help="Export the catalog (or one source) to CSV")
+    export_parser.add_argument("--source", default=None, help="Only videos of this source, e.g. midel.csv")
+    export_parser.add_argument("--output", required=True)
+
+    args = parser.parse_args()
+    catalog = VideoCatalog(args.catalog)
+    try:
+        if args.command == "import":
+            for csv_file in args.csv_files:
+                catalog.import_csv(csv_file)
+        elif args.command == "export":
+            catalog.export_csv(args.output, args.source)
+    finally:
+        catalog.close()
@@ -0,0 +1,234 @@
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import re
+import shutil
+from array import array
+
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_FILTER_CACHE_DIR = os.path.join(BASE_DIR, "output", "filter_cache")
+
+SNAPSHOT_FILE = "snapshot.pickle"
+SEPARATOR = b"\x00"  # between rows of the text blob, keywords never contain it so matches never span rows
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_POLISH_FOLD = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+
+
+def fold_diacritics(text):
+    return text.translate(_POLISH_FOLD)
+
+
+def normalize_keyword_text(text, fold):
+    text = text.lower()
+    return fold_diacritics(text) if fold else text
+
+
+class KeywordMatcher:
+    """Literal keyword matcher over a UTF-8 blob of rows (keywords are plain text, not regexes).
+
+    All keywords are compiled into one escaped `re` alternation searched over the whole
+    date slice, so the loop over rows runs in C and Python only sees the rows that match.
+    This is not Aho-Corasick: the regex engine tries the alternatives one by one at each
+    position, so the scan costs O(text length x number of keywords) in the worst case.
+    UTF-8 is self-synchronizing, so byte-level matches always start on a character boundary.
+    """
+
+    def __init__(self, keywords):
+        keywords = sorted({keyword.encode("utf-8") for keyword in keywords if keyword}, key=len, reverse=True)
+        self._pattern = re.compile(b"|".join(map(re.escape, keywords))) if keywords else None
+
+    def match_rows(self, blob, offsets, lo, hi):
+        """Row numbers in [lo, hi) whose text contains a keyword; row i is blob[offsets[i]:offsets[i + 1]]."""
+        rows = []
+        if self._pattern is None:
+            return rows
+
+        position, end = offsets[lo], offsets[hi]
+        while True:
+            match = self._pattern.search(blob, position, end)
+            if match is None:
+                return rows
+            row = bisect.bisect_right(offsets, match.start()) - 1
+            rows.append(row)
+            position = offsets[row + 1]  # the rest of this row does not matter any more
+
+
+class CatalogSnapshot:
+    """Catalog columns pre-parsed for filtering, stored per catalog revision in `snapshot_dir`.
+
+    Rows are sorted by publication time and `published` holds "YYYY-MM-DD HH:MM:SS" strings,
+    so a date range is a binary-search slice; rows with an unparsable date come after `n_dated`.
+    `channel_rows` maps a channel name to its sorted row numbers. Lowercased title + description
+    of all rows live in separator-joined UTF-8 files (plain and diacritic-folded) that are
+    memory-mapped, not loaded.
+    """
+
+    def __init__(self, snapshot_dir, revision, video_ids, published, n_dated, channel_rows):
+        self.snapshot_dir = snapshot_dir
+        self.revision = revision
+        self.video_ids = video_ids
+        self.published = published
+        self.n_dated = n_dated
+        self.channel_rows = channel_rows
+        self._texts = {}
+
+    @classmethod
+    def build(cls, snapshot_dir, revision, rows):
+        published = pd.to_datetime(pd.Series([row[3] for row in rows], dtype=object),
+                                   errors="coerce", utc=True, format="ISO8601").dt.strftime(DATE_FORMAT)
+        published = [value if isinstance(value, str) else None for value in published]
+        order = sorted(range(len(rows)), key=lambda i: (published[i] is None, published[i] or ""))
+
+        channel_rows = {}
+        for row_no, i in enumerate(order):
+            channel_rows.setdefault(rows[i][5], array("q")).append(row_no)
+
+        os.makedirs(snapshot_dir, exist_ok=True)
+        snapshot = cls(snapshot_dir, revision, [rows[i][0] for i in order], [published[i] or "" for i in order],
+                       sum(1 for value in published if value is not None), channel_rows)
+        for fold in (False, True):
+            snapshot.write_text((f"{rows[i][1] or ''}\n{rows[i][2] or ''}" for i in order), fold)
+
+        with open(os.path.join(snapshot_dir, SNAPSHOT_FILE), "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return snapshot
+
+    @classmethod
+    def load(cls, snapshot_dir):
+        with open(os.path.join(snapshot_dir, SNAPSHOT_FILE), "rb") as f:
+            return pickle.load(f)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_texts"] = {}  # maps are re-opened on demand
+        return state
+
+    def text_path(self, fold):
+        return os.path.join(self.snapshot_dir, "text-folded" if fold else "text")
+
+    def write_text(self, texts, fold):
+        offsets = array("q", [0])
+        with open(f"{self.text_path(fold)}.bin", "wb") as f:
+            for text in texts:
+                data = normalize_keyword_text(text, fold).encode("utf-8") + SEPARATOR
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        with open(f"{self.text_path(fold)}.offsets", "wb") as f:
+            offsets.tofile(f)
+
+    def text(self, fold):
+        # (memory-mapped blob, offsets), offsets has len(rows) + 1 entries
+        if fold not in self._texts:
+            offsets = array("q")
+            with open(f"{self.text_path(fold)}.offsets", "rb") as f:
+                offsets.frombytes(f.read())
+            with open(f"{self.text_path(fold)}.bin", "rb") as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+            self._texts[fold] = (blob, offsets)
+        return self._texts[fold]
+
+    def date_range(self, start_date=None, end_date=None):
+        # same bounds as before: published_at >= start_date 00:00:00 and <= end_date 00:00:00
+        if not start_date and not end_date:
+            return 0, len(self.video_ids)
+        lo = bisect.bisect_left(self.published, start_date, 0, self.n_dated) if start_date else 0
+        hi = bisect.bisect_right(self.published, f"{end_date} 00:00:00", 0, self.n_dated) if end_date else self.n_dated
+        return lo, max(lo, hi)
+
+    def filter(self, keywords=None, channels=None, start_date=None, end_date=None, fold=False):
+        """Row numbers (in publication order) of videos matching all given filters."""
+        lo, hi = self.date_range(start_date, end_date)
+
+        channel_set = None
+        if channels:
+            channel_set = set()
+            for channel in channels:
+                channel_rows = self.channel_rows.get(channel, ())
+                channel_set.update(channel_rows[bisect.bisect_left(channel_rows, lo):bisect.bisect_left(channel_rows, hi)])
+
+        if not keywords:
+            return sorted(channel_set) if channel_set is not None else list(range(lo, hi))
+
+        blob, offsets = self.text(fold)
+        matcher = KeywordMatcher([normalize_keyword_text(keyword, fold) for keyword in keywords])
+        return [row for row in matcher.match_rows(blob, offsets, lo, hi) if channel_set is None or row in channel_set]
+
+
+class VideoFilter:
+    """Filters the video catalog through its snapshot, with query results cached on disk.
+
+    With `sources` (video list names, e.g. channel_videos.csv) the snapshot only holds
+    the videos of those lists; None takes the whole catalog.
+    """
+
+    def __init__(self, catalog, cache_dir=DEFAULT_FILTER_CACHE_DIR, sources=None):
+        self.catalog = catalog
+        self.cache_dir = cache_dir
+        self.sources = sorted(set(sources)) if sources else None
+        self.revision = catalog.revision()
+        self.snapshot_prefix = f"revision-{self.revision}-"
+        sources_key = hashlib.sha1(json.dumps(self.sources, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+        self.snapshot_dir = os.path.join(cache_dir, f"{self.snapshot_prefix}{sources_key}")
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self.load_snapshot()
+        return self._snapshot
+
+    def load_snapshot(self):
+        if os.path.exists(os.path.join(self.snapshot_dir, SNAPSHOT_FILE)):
+            return CatalogSnapshot.load(self.snapshot_dir)
+
+        logging.info(f"🔄 Building catalog snapshot (revision {self.revision})...")
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)  # leftovers of an interrupted build
+        snapshot = CatalogSnapshot.build(self.snapshot_dir, self.revision, self.catalog_rows())
+
+        # snapshots and results of older revisions are stale
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.startswith(self.snapshot_prefix):
+                shutil.rmtree(entry.path, ignore_errors=True) if entry.is_dir() else os.remove(entry.path)
+        logging.info(f"📂 Catalog snapshot: {len(snapshot.video_ids)} videos")
+        return snapshot
+
+    def catalog_rows(self):
+        if self.sources is None:
+            return self.catalog.query()
+        rows = {}
+        for source in self.sources:  # a video can be on several lists
+            rows.update((row[0], row) for row in self.catalog.query(source=source))
+        return list(rows.values())
+
+    def query_key(self, keywords, channels, start_date, end_date, fold):
+        query = [sorted(keywords or []), sorted(channels or []), start_date, end_date, fold]
+        return hashlib.sha1(json.dumps(query, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def filter(self, keywords=None, channels=None, start_date=None, end_date=None, fold=False):
+        """Matching catalog rows, tuples of (video_id, title, description, published_at, channel_id, channel_name)."""
+        results_dir = os.path.join(self.snapshot_dir, "results")
+        result_path = os.path.join(results_dir, f"{self.query_key(keywords, channels, start_date, end_date, fold)}.json")
+
+        snapshot = self.snapshot
+        if os.path.exists(result_path):
+            with open(result_path, "r", encoding="utf-8") as f:
+                row_numbers = json.load(f)
+            logging.info("⚡ Filter result loaded from cache")
+        else:
+            row_numbers = snapshot.filter(keywords, channels, start_date, end_date, fold)
+            os.makedirs(results_dir, exist_ok=True)
+            with open(f"{result_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(row_numbers, f)
+            os.replace(f"{result_path}.tmp", result_path)
+
+        # published_at is written pre-parsed ("YYYY-MM-DD HH:MM:SS"), the rest comes from the catalog
+        video_ids = [snapshot.video_ids[row_no] for row_no in row_numbers]
+        published = {video_id: snapshot.published[row_no] for video_id, row_no in zip(video_ids, row_numbers)}
+        return [row[:3] + (published[row[0]],) + row[4:] for row in self.catalog.get_rows(video_ids)]